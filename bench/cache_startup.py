@@ -0,0 +1,69 @@
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+import script_cache
+
+TEST_SCRIPTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_scripts"
+)
+
+
+def time_load(path: str, repeat: int) -> float:
+    with open(path) as f:
+        source = f.read()
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        main_scanner.load_program(source, cache_for=path)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def cold_and_warm(path: str, repeat: int = 5):
+    cold = None
+    for _ in range(repeat):
+        shutil.rmtree(os.path.dirname(script_cache.cache_path(path)), True)
+        elapsed = time_load(path, 1)
+        cold = elapsed if cold is None else min(cold, elapsed)
+    warm = time_load(path, repeat)
+    return cold, warm
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        scripts = []
+        # Only the scripts themselves: running them leaves a __loxcache__ here.
+        for path in sorted(glob.glob(os.path.join(TEST_SCRIPTS, "*.txt"))):
+            shutil.copy(path, directory)
+            scripts.append(os.path.join(directory, os.path.basename(path)))
+
+        generated = os.path.join(directory, "generated_large.txt")
+        with open(os.path.join(TEST_SCRIPTS, "script8.txt")) as f:
+            body = f.read()
+        with open(generated, "w") as f:
+            for i in range(300):
+                f.write(body.replace("Egotist", f"Egotist{i}"))
+                f.write("\n")
+        scripts.append(generated)
+
+        print(f"{'script':<30}{'cold ms':>10}{'warm ms':>10}{'speedup':>10}")
+        for path in scripts:
+            cold, warm = cold_and_warm(path)
+            print(
+                f"{os.path.basename(path):<30}{cold * 1e3:>10.2f}{warm * 1e3:>10.2f}"
+                f"{cold / warm:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main_scanner
+
+PROGRAMS = {
+    "fib(22)": """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+print fib(22);
+""",
+    "return from loop": """
+fun find(limit) {
+  var i = 0;
+  while (true) {
+    if (i == limit) { return i; }
+    i = i + 1;
+  }
+}
+var total = 0;
+for (var j = 0; j < 3000; j = j + 1) total = total + find(10);
+print total;
+""",
+    "implicit return": """
+fun noop(a) { a; }
+for (var i = 0; i < 50000; i = i + 1) noop(i);
+""",
+}
+
+
+def main():
+    with open(os.path.join(ROOT, "test_scripts", "fibonacci_climb.txt")) as f:
+        PROGRAMS["fibonacci_climb.txt"] = f.read()
+
+    print(f"{'program':<22}{'best of 3':>12}")
+    for label, source in PROGRAMS.items():
+        best = None
+        for _ in range(3):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                main_scanner.run(source)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:<22}{best:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
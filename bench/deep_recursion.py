@@ -0,0 +1,86 @@
+"""Stress-tests Lox recursion on the vm engine, whose call frames live on
+the heap, at depths far beyond Python's recursion limit."""
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+
+PROGRAMS = {
+    "countdown": """
+fun down(n) {
+  if (n < 1) return 0;
+  return down(n - 1) + 1;
+}
+print down(%d);
+""",
+    "mutual recursion": """
+fun isEven(n) { if (n < 1) return true; return isOdd(n - 1); }
+fun isOdd(n) { if (n < 1) return false; return isEven(n - 1); }
+print isEven(%d);
+""",
+    "method recursion": """
+class Node {
+  depth(n) {
+    if (n < 1) return 0;
+    return this.depth(n - 1) + 1;
+  }
+}
+print Node().depth(%d);
+""",
+    "closure recursion": """
+fun make() {
+  var calls = 0;
+  fun walk(n) {
+    calls = calls + 1;
+    if (n < 1) return calls;
+    return walk(n - 1);
+  }
+  return walk;
+}
+print make()(%d);
+""",
+}
+
+DEPTHS = (100_000, 500_000)
+
+
+def run(source: str, max_call_depth=None):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        main_scanner.run(
+            source,
+            engine="vm",
+            options=main_scanner.RunOptions(max_call_depth=max_call_depth),
+        )
+    main_scanner.errors().clear()
+    return stdout.getvalue().strip(), stderr.getvalue().strip()
+
+
+def main():
+    print(f"{'program':<20}{'depth':>9}{'time':>10}{'peak MB':>10}  result")
+    for label, template in PROGRAMS.items():
+        for depth in DEPTHS:
+            tracemalloc.start()
+            start = time.perf_counter()
+            output, errors = run(template % depth)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+            print(
+                f"{label:<20}{depth:>9}{elapsed:>9.2f}s{peak:>10.1f}  "
+                f"{output or errors.splitlines()[0]}"
+            )
+
+    _, errors = run(PROGRAMS["countdown"] % 100_000, max_call_depth=50_000)
+    print(f"\ncountdown(100000) with --max-call-depth 50000: {errors.splitlines()[0]}")
+
+
+if __name__ == "__main__":
+    main()
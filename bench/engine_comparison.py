@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+
+PROGRAMS = {
+    "fib(25)": """
+fun fib(n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+print fib(25);
+""",
+    "method calls": """
+class Vector {
+    dot(a, b) { return a * b + this.scale(a); }
+    scale(x) { return x * 2; }
+}
+class Scaled < Vector {
+    scale(x) { return super.scale(x) + 1; }
+}
+var v = Scaled();
+var total = 0;
+for (var i = 0; i < 30000; i = i + 1) {
+    total = total + v.dot(i, 2);
+}
+print total;
+""",
+    "closures": """
+fun adder(n) {
+    fun add(x) { return x + n; }
+    return add;
+}
+var add2 = adder(2);
+var total = 0;
+var i = 0;
+while (i < 100000) {
+    total = add2(total);
+    i = i + 1;
+}
+print total;
+""",
+}
+
+
+def best_time(source: str, engine: str, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            main_scanner.run(source, engine=engine)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    engines = main_scanner.ENGINES
+    print(f"{'program':<16}" + "".join(f"{engine:>12}" for engine in engines))
+    for label, source in PROGRAMS.items():
+        times = [best_time(source, engine) for engine in engines]
+        row = f"{label:<16}" + "".join(f"{t:>11.3f}s" for t in times)
+        speedups = "  ".join(
+            f"{engine} {times[0] / t:.1f}x"
+            for engine, t in zip(engines[1:], times[1:])
+        )
+        print(f"{row}   {speedups}")
+
+
+if __name__ == "__main__":
+    main()
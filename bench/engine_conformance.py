@@ -0,0 +1,178 @@
+"""Runs every script in test_scripts/, the engine_comparison programs and the
+cases below under each execution engine and reports any whose output differs
+from the tree-walking interpreter's. Output means everything written to
+stdout and stderr, in order, so error messages and their [line N] are
+compared too. A Python exception escaping any engine is a failure."""
+import contextlib
+import glob
+import io
+import os
+import sys
+from typing import Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+from engine_comparison import PROGRAMS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts that print clock readings: only the number of lines they print is
+# compared.
+TIMED = {"fib_time.txt"}
+
+# Programs written to catch engines disagreeing on the details: how values
+# print, what errors say and which line they point at, and what closures
+# capture.
+CASES = {
+    "print functions": """
+fun f() {}
+class A { m() {} }
+var a = A();
+print f;
+print a.m;
+var m = a.m;
+print m;
+print A;
+print a;
+print clock;
+""",
+    "class fields": """
+class Point {
+    init(x, y) { this.x = x; this.y = y; }
+    sum() { return this.x + this.y; }
+}
+var p = Point(1, 2);
+p.z = 3;
+p.x = "one";
+print p.x;
+print p.z;
+var q = Point(4, 5);
+print q.sum();
+q.sum = "shadowed";
+print q.sum;
+var method = p.sum;
+p.x = 10;
+print method();
+""",
+    "closures in loops": """
+var fns = nil;
+for (var i = 0; i < 3; i = i + 1) {
+    var j = i;
+    fun show() { print j; }
+    if (i == 0) fns = show;
+    show();
+}
+fns();
+var n = 0;
+while (n < 3) {
+    var seen = 0;
+    fun bump() { seen = seen + 1; return seen; }
+    bump();
+    print bump();
+    n = n + 1;
+}
+""",
+    "undefined variable": """
+print "before";
+print nope;
+print "after";
+""",
+    "undefined property": """
+class A {}
+var a = A();
+print "before";
+print a.missing;
+""",
+    "wrong arity": """
+fun f(a, b) { return a + b; }
+print f(1, 2);
+print f(1);
+""",
+    "call a non-callable": """
+var x = "text";
+x();
+""",
+    "bad operands": """
+print 1 + 2;
+print 1 + "two";
+""",
+    "bad operand to minus": """
+print "before";
+print -"x";
+""",
+
+    "error inside a function": """
+fun outer() {
+    fun inner() {
+        return nil.field;
+    }
+    return inner();
+}
+print "start";
+outer();
+""",
+    "compile error": """
+print "never printed";
+var = 1;
+""",
+}
+
+
+def nested_loops(depth: int) -> str:
+    """Loops nested deeper than CPython lets blocks nest in one function."""
+    opening = "".join(f"{'    ' * i}while (x < 1) {{\n" for i in range(depth))
+    closing = "".join(f"{'    ' * i}}}\n" for i in reversed(range(depth)))
+    return f"var x = 0;\n{opening}{'    ' * depth}x = x + 1;\n{closing}print x;\n"
+
+
+CASES["deeply nested loops"] = nested_loops(25)
+
+
+def output_of(source: str, engine: str) -> Tuple[str, bool]:
+    """Everything the program wrote, and whether a Python exception escaped
+    the engine."""
+    output = io.StringIO()
+    crashed = False
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            main_scanner.run(source, engine=engine)
+        except Exception as e:
+            output.write(f"\n{type(e).__name__}: {e}\n")
+            crashed = True
+    main_scanner.errors().clear()
+    return output.getvalue(), crashed
+
+
+def comparable(label: str, output: str):
+    return output.count("\n") if label in TIMED else output
+
+
+def main():
+    programs = {**PROGRAMS, **CASES}
+    for path in sorted(glob.glob(os.path.join(ROOT, "test_scripts", "*.txt"))):
+        with open(path) as f:
+            programs[os.path.basename(path)] = f.read()
+
+    failures = 0
+    for label, source in programs.items():
+        expected = None
+        for engine in main_scanner.ENGINES:
+            output, crashed = output_of(source, engine)
+            output = comparable(label, output)
+            if expected is None:
+                expected = output
+            if crashed:
+                failures += 1
+                print(f"CRASH {label} ({engine})")
+            elif output != expected:
+                failures += 1
+                print(f"FAIL {label} ({engine})")
+                if label in CASES:
+                    print(f"  expected: {expected!r}\n  actual:   {output!r}")
+    print(f"{len(programs)} programs, {failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
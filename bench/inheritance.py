@@ -0,0 +1,73 @@
+"""Times method lookups on a ten-level class hierarchy: methods inherited
+from the root class, an override at every level that chains through super,
+and initializers that do the same."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+from engine_comparison import best_time
+
+LEVELS = 10
+CALLS = 20000
+
+
+def hierarchy(levels: int) -> str:
+    classes = [
+        """
+class Level0 {
+    init() { this.depth = 0; }
+    root() { return 1; }
+    chain() { return 1; }
+}"""
+    ]
+    for level in range(1, levels):
+        classes.append(
+            f"""
+class Level{level} < Level{level - 1} {{
+    init() {{ super.init(); this.depth = this.depth + 1; }}
+    chain() {{ return super.chain() + 1; }}
+}}"""
+        )
+    return "".join(classes)
+
+
+PROGRAMS = {
+    "inherited": f"""
+var leaf = Level{LEVELS - 1}();
+var total = 0;
+for (var i = 0; i < {CALLS}; i = i + 1) {{
+    total = total + leaf.root();
+}}
+print total;
+""",
+    "super chain": f"""
+var leaf = Level{LEVELS - 1}();
+var total = 0;
+for (var i = 0; i < {CALLS // LEVELS}; i = i + 1) {{
+    total = total + leaf.chain();
+}}
+print total;
+""",
+    "construction": f"""
+var total = 0;
+for (var i = 0; i < {CALLS // LEVELS}; i = i + 1) {{
+    total = total + Level{LEVELS - 1}().depth;
+}}
+print total;
+""",
+}
+
+
+def main():
+    classes = hierarchy(LEVELS)
+    engines = main_scanner.ENGINES
+    print(f"{'program':<16}" + "".join(f"{engine:>12}" for engine in engines))
+    for label, body in PROGRAMS.items():
+        times = [best_time(classes + body, engine) for engine in engines]
+        print(f"{label:<16}" + "".join(f"{t:>11.3f}s" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Builds a million small Lox objects, all with the same three fields, and
+reports the memory each one takes and how fast their fields can be read."""
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+
+COUNT = 1_000_000
+PASSES = 5
+ENGINES = ("tree", "closure", "vm")
+
+BUILD = """
+class Node {
+    init(value, next) {
+        this.value = value;
+        this.next = next;
+        this.double = value * 2;
+    }
+}
+// Not nil: a field holding nil reads as missing.
+var head = false;
+for (var i = 0; i < %d; i = i + 1) {
+    head = Node(i, head);
+}
+"""
+
+WALK = """
+var total = 0;
+for (var pass = 0; pass < %d; pass = pass + 1) {
+    var node = head;
+    while (node) {
+        total = total + node.value + node.double;
+        node = node.next;
+    }
+}
+print total;
+"""
+
+
+def run(source: str, engine: str) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        main_scanner.run(source, engine=engine)
+
+
+def main():
+    print(f"{'engine':<9}{'bytes/object':>14}{'walk':>10}{'field reads/s':>16}")
+    for engine in ENGINES:
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        run(BUILD % COUNT, engine)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # Time only the walk: subtract a run that just builds the list.
+        start = time.perf_counter()
+        run(BUILD % COUNT, engine)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        run(BUILD % COUNT + WALK % PASSES, engine)
+        walk = time.perf_counter() - start - build
+
+        print(
+            f"{engine:<9}{(peak - base) / COUNT:>14.0f}{walk:>9.2f}s"
+            f"{3 * COUNT * PASSES / walk:>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Counts the environments and function objects created while running
+method-heavy Lox programs on the tree and closure engines. Method calls made
+straight off a property should not allocate a bound method."""
+import collections
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import closure_compiler
+import environment
+import lox_function
+import main_scanner
+
+PROGRAMS = {
+    "method calls": """
+class Point {
+    init(x, y) { this.x = x; this.y = y; }
+    dot(other) { return this.x * other.x + this.y * other.y; }
+    norm() { return this.dot(this); }
+}
+var p = Point(3, 4);
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+    total = total + p.norm();
+}
+print total;
+""",
+    "super calls": """
+class Shape { area() { return 1; } }
+class Square < Shape { area() { return super.area() * 4; } }
+class Cube < Square { area() { return super.area() * 6; } }
+var c = Cube();
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+    total = total + c.area();
+}
+print total;
+""",
+    "bound methods": """
+class Counter {
+    init() { this.n = 0; }
+    bump() { this.n = this.n + 1; }
+}
+var c = Counter();
+for (var i = 0; i < 20000; i = i + 1) {
+    var bump = c.bump;
+    bump();
+}
+print c.n;
+""",
+}
+
+COUNTED = [
+    environment.Environment,
+    lox_function.LoxFunction,
+    getattr(lox_function, "LoxBoundMethod", None),
+    closure_compiler.CompiledFunction,
+]
+
+
+@contextlib.contextmanager
+def counting(counts):
+    originals = {}
+    for cls in filter(None, COUNTED):
+        original = cls.__init__
+        originals[cls] = original
+
+        def counted_init(self, *args, _original=original, _name=cls.__name__):
+            counts[_name] += 1
+            _original(self, *args)
+
+        cls.__init__ = counted_init
+    try:
+        yield
+    finally:
+        for cls, original in originals.items():
+            cls.__init__ = original
+
+
+def main():
+    names = [cls.__name__ for cls in filter(None, COUNTED)]
+    header = f"{'program':<16}{'engine':<9}{'time':>8}"
+    print(header + "".join(f"{name:>18}" for name in names))
+    for label, source in PROGRAMS.items():
+        for engine in ("tree", "closure"):
+            counts = collections.Counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                main_scanner.run(source, engine=engine)
+                elapsed = time.perf_counter() - start
+                with counting(counts):
+                    main_scanner.run(source, engine=engine)
+            print(
+                f"{label:<16}{engine:<9}{elapsed:>7.3f}s"
+                + "".join(f"{counts[n]:>18}" for n in names)
+            )
+
+
+if __name__ == "__main__":
+    main()
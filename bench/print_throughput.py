@@ -0,0 +1,48 @@
+"""Prints a million lines from a Lox loop into a file through different
+output sinks: the default batched one, one that writes and flushes every
+line as print() used to, and an in-memory buffer."""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+import output_sink
+
+LINES = 1_000_000
+ENGINES = ("closure", "vm", "python")
+
+PROGRAM = """
+for (var i = 0; i < %d; i = i + 1) {
+    print i;
+}
+""" % LINES
+
+
+def timed_run(engine: str, sink: output_sink.OutputSink) -> float:
+    start = time.perf_counter()
+    main_scanner.run(
+        PROGRAM, engine=engine, options=main_scanner.RunOptions(output=sink)
+    )
+    sink.close()
+    return time.perf_counter() - start
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "output.txt")
+    sinks = {
+        "batched": lambda: output_sink.FileSink(path),
+        "per line": lambda: output_sink.FileSink(path, buffer_lines=1),
+        "memory": output_sink.MemorySink,
+    }
+    print(f"{'engine':<9}" + "".join(f"{label:>12}" for label in sinks))
+    for engine in ENGINES:
+        times = [timed_run(engine, make_sink()) for make_sink in sinks.values()]
+        print(f"{engine:<9}" + "".join(f"{t:>11.2f}s" for t in times))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
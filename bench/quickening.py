@@ -0,0 +1,82 @@
+"""Times numeric programs on the tree-walking interpreter with Binary nodes
+quickened to their operand types, and with quickening switched off so every
+operation takes the generic path."""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+import interpreter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ROOT, "test_scripts", "iterative_count.txt")) as f:
+    ITERATIVE_COUNT = f.read()
+
+PROGRAMS = {
+    "loop sum": """
+var total = 0;
+for (var i = 0; i < 50000; i = i + 1) {
+    total = total + i * 2 - 1;
+}
+print total;
+""",
+    "fib(20)": """
+fun fib(n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+print fib(20);
+""",
+    "counters": """
+var evens = 0;
+var odds = 0;
+var n = 0;
+while (n < 30000) {
+    if (n / 2 - (n / 2 - 0.5) > 0.5) evens = evens + 1;
+    else odds = odds + 1;
+    n = n + 1;
+}
+print evens + odds;
+""",
+    "iterative_count": ITERATIVE_COUNT,
+    "string concat": """
+var s = "";
+for (var i = 0; i < 20000; i = i + 1) {
+    s = s + "x";
+}
+""",
+}
+
+
+def best_time(source: str, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            main_scanner.run(source, engine="tree")
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    quicken = interpreter.Interpreter.quicken
+    print(f"{'program':<18}{'generic':>10}{'quickened':>11}")
+    for label, source in PROGRAMS.items():
+        interpreter.Interpreter.quicken = lambda self, expr, left, right: None
+        generic = best_time(source)
+        interpreter.Interpreter.quicken = quicken
+        quickened = best_time(source)
+        print(
+            f"{label:<18}{generic:>9.3f}s{quickened:>10.3f}s"
+            f"   {generic / quickened:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Runs the Lox programs in bench/programs/ through main_scanner.run and
+reports how long each takes, phase by phase.
+
+Each program gets warmup runs, then timed runs whose median is reported.
+Results can be written as JSON, and compared against an earlier JSON file
+to flag programs that got slower.
+
+    python bench/run_suite.py --engine tree --engine vm --json current.json
+    python bench/run_suite.py --baseline current.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+import output_sink
+import run_stats
+
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+PHASES = ("scan", "parse", "resolve", "execute")
+
+
+def program_paths():
+    return {
+        os.path.splitext(os.path.basename(path))[0]: path
+        for path in sorted(glob.glob(os.path.join(PROGRAMS, "*.lox")))
+    }
+
+
+def load_programs(names):
+    programs = {}
+    for name, path in program_paths().items():
+        if names and name not in names:
+            continue
+        with open(path) as f:
+            programs[name] = f.read()
+    return programs
+
+
+def run_once(source: str, engine: str):
+    stats = run_stats.RunStats(trace_memory=False)
+    options = main_scanner.RunOptions(output=output_sink.MemorySink(), stats=stats)
+    start = time.perf_counter()
+    main_scanner.run(source, engine=engine, options=options)
+    timings = {name: phase.seconds for name, phase in stats.phases.items()}
+    timings["total"] = time.perf_counter() - start
+
+    errors = main_scanner.errors()
+    failed = errors.had_error or errors.had_runtime_error
+    errors.clear()
+    if failed:
+        raise SystemExit("Lox program failed; see stderr above")
+    return timings
+
+
+def measure(source: str, engine: str, warmup: int, repeat: int):
+    for _ in range(warmup):
+        run_once(source, engine)
+    runs = [run_once(source, engine) for _ in range(repeat)]
+    totals = [run["total"] for run in runs]
+    return {
+        "median": statistics.median(totals),
+        "min": min(totals),
+        "max": max(totals),
+        "stdev": statistics.stdev(totals) if len(totals) > 1 else 0.0,
+        "phases": {
+            phase: statistics.median(run.get(phase, 0.0) for run in runs)
+            for phase in PHASES
+        },
+        "runs": totals,
+    }
+
+
+def compare(results, baseline, threshold: float):
+    """Prints how each result moved against the baseline and returns the
+    keys that got slower by more than the threshold."""
+    regressions = []
+    print(f"\n{'benchmark':<28}{'baseline':>10}{'current':>10}{'change':>9}")
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            print(f"{key:<28}{'-':>10}{result['median']:>9.4f}s")
+            continue
+        change = result["median"] / before["median"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(
+            f"{key:<28}{before['median']:>9.4f}s{result['median']:>9.4f}s"
+            f"{change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument(
+        "--engine",
+        action="append",
+        choices=main_scanner.ENGINES,
+        help="engine to run the programs on; repeat for several (default: tree)",
+    )
+    arg_parser.add_argument(
+        "--program", action="append", help="only run this program; repeatable"
+    )
+    arg_parser.add_argument("--warmup", type=int, default=1)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--json", metavar="FILE", help="write results to FILE")
+    arg_parser.add_argument(
+        "--baseline", metavar="FILE", help="compare against results saved earlier"
+    )
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="slowdown of the median, as a fraction, reported as a regression",
+    )
+    args = arg_parser.parse_args()
+    engines = args.engine or ["tree"]
+    unknown = sorted(set(args.program or ()) - set(program_paths()))
+    if unknown:
+        arg_parser.error(
+            f"unknown program {', '.join(unknown)} "
+            f"(choose from {', '.join(program_paths())})"
+        )
+
+    header = f"{'benchmark':<28}{'median':>10}{'stdev':>9}"
+    print(header + "".join(f"{phase:>10}" for phase in PHASES))
+    results = {}
+    for name, source in load_programs(args.program).items():
+        for engine in engines:
+            key = f"{name}/{engine}"
+            result = measure(source, engine, args.warmup, args.repeat)
+            results[key] = result
+            print(
+                f"{key:<28}{result['median']:>9.4f}s{result['stdev']:>8.4f}s"
+                + "".join(f"{result['phases'][p]:>9.4f}s" for p in PHASES)
+            )
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
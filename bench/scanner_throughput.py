@@ -0,0 +1,72 @@
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner
+import regex_scanner
+
+TEST_SCRIPTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_scripts"
+)
+
+ENGINES = {
+    "classic": scanner.Scanner,
+    "regex": regex_scanner.RegexScanner,
+}
+
+
+def load_corpus() -> str:
+    sources = []
+    # Only the scripts themselves: running them leaves a __loxcache__ here.
+    for path in sorted(glob.glob(os.path.join(TEST_SCRIPTS, "*.txt"))):
+        with open(path) as f:
+            sources.append(f.read())
+    return "\n".join(sources)
+
+
+def synthetic_source(size: int) -> str:
+    chunk = (
+        "// generated helper\n"
+        "fun helper_function(first, second) {\n"
+        '    var message = "generated string literal";\n'
+        "    if (first >= second and second != 12.5) return first * 3 - second;\n"
+        "    return helper_function(second, first / 2);\n"
+        "}\n"
+    )
+    return chunk * (size // len(chunk) + 1)
+
+
+def throughput(engine, source: str, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine(source).scanTokens()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(source.encode("utf-8")) / best / 1e6
+
+
+def main():
+    corpus = load_corpus()
+    inputs = [
+        ("test_scripts corpus", corpus),
+        ("test_scripts x200", "\n".join([corpus] * 200)),
+        ("synthetic 1 MB", synthetic_source(1_000_000)),
+        ("synthetic 8 MB", synthetic_source(8_000_000)),
+    ]
+
+    print(f"{'input':<22}{'size':>12}" + "".join(f"{e:>14}" for e in ENGINES))
+    for label, source in inputs:
+        repeat = 5 if len(source) < 2_000_000 else 2
+        row = f"{label:<22}{len(source):>12}"
+        for engine in ENGINES.values():
+            row += f"{throughput(engine, source, repeat):>9.2f} MB/s"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
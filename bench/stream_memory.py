@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+import stream_scanner
+
+
+def generate_script(path: str, statements: int) -> None:
+    with open(path, "w") as f:
+        f.write("var total = 0;\n")
+        for i in range(statements):
+            f.write(f"// statement {i}\n")
+            f.write(f'var name_{i % 100} = "generated value number {i}";\n')
+            f.write(f"total = total + {i} * 2 - (total / 3);\n")
+
+
+def measure(label: str, action) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10}{elapsed:>10.2f} s{peak / 1e6:>12.2f} MB peak")
+
+
+def run_whole(path: str) -> None:
+    with open(path) as f:
+        main_scanner.run(f.read())
+
+
+def run_streaming(path: str) -> None:
+    with open(path, "rb") as f:
+        main_scanner.execute_stream(stream_scanner.StreamScanner(f))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for statements in (5_000, 20_000):
+            path = os.path.join(directory, "generated.lox")
+            generate_script(path, statements)
+            size = os.path.getsize(path) / 1e6
+            print(f"generated script: {statements} statements, {size:.1f} MB")
+            measure("whole", lambda: run_whole(path))
+            measure("stream", lambda: run_streaming(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Builds a large string one 100-character piece at a time with `s = s +
+piece;` and prints it, on every engine. Ropes keep this linear in the size
+of the result; with them switched off each concatenation copies the whole
+string built so far."""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lox_string
+import main_scanner
+
+PIECE = "0123456789" * 10
+
+PROGRAM = """
+var piece = "%s";
+var s = "";
+for (var i = 0; i < %d; i = i + 1) {
+    s = s + piece;
+}
+print s;
+"""
+
+SIZES = (1_000_000, 10_000_000)
+
+
+def timed_run(source: str, engine: str) -> float:
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        start = time.perf_counter()
+        main_scanner.run(source, engine=engine)
+        elapsed = time.perf_counter() - start
+    assert len(stdout.getvalue()) > 0
+    return elapsed
+
+
+def main():
+    min_rope_length = lox_string.MIN_ROPE_LENGTH
+    print(f"{'engine':<9}{'size':>12}{'ropes':>10}{'flat':>10}")
+    for engine in main_scanner.ENGINES:
+        for size in SIZES:
+            source = PROGRAM % (PIECE, size // len(PIECE))
+            lox_string.MIN_ROPE_LENGTH = min_rope_length
+            ropes = timed_run(source, engine)
+            # Flat strings are quadratic: only time them on the small size.
+            flat = "-"
+            if size == SIZES[0]:
+                lox_string.MIN_ROPE_LENGTH = float("inf")
+                flat = f"{timed_run(source, engine):.2f}s"
+                lox_string.MIN_ROPE_LENGTH = min_rope_length
+            print(f"{engine:<9}{size:>12,}{ropes:>9.2f}s{flat:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Runs tail-recursive loops a million calls deep on the engines that support
+proper tail calls, with and without --no-tail-calls. With tail calls the
+peak memory stays flat however many iterations run."""
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+
+PROGRAMS = {
+    "loop": """
+fun loop(n, acc) {
+  if (n < 1) return acc;
+  return loop(n - 1, acc + 1);
+}
+print loop(%d, 0);
+""",
+    "mutual": """
+fun isEven(n) { if (n < 1) return true; return isOdd(n - 1); }
+fun isOdd(n) { if (n < 1) return false; return isEven(n - 1); }
+print isEven(%d);
+""",
+    "method": """
+class Counter {
+  count(n, acc) {
+    if (n < 1) return acc;
+    return this.count(n - 1, acc + 1);
+  }
+}
+print Counter().count(%d, 0);
+""",
+}
+
+ENGINES = ("tree", "closure", "vm")
+ITERATIONS = (100_000, 1_000_000)
+
+
+def run(source: str, engine: str, tail_calls: bool):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        main_scanner.run(
+            source,
+            engine=engine,
+            options=main_scanner.RunOptions(tail_calls=tail_calls),
+        )
+    main_scanner.errors().clear()
+    return stdout.getvalue().strip() or stderr.getvalue().strip().splitlines()[0]
+
+
+def main():
+    print(
+        f"{'program':<10}{'engine':<9}{'calls':>9}{'tail':>6}{'time':>9}"
+        f"{'peak MB':>9}  result"
+    )
+    for label, template in PROGRAMS.items():
+        for engine in ENGINES:
+            for iterations in ITERATIONS:
+                for tail_calls in (True, False):
+                    if not tail_calls and iterations > ITERATIONS[0]:
+                        continue
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    result = run(template % iterations, engine, tail_calls)
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1] / 2**20
+                    tracemalloc.stop()
+                    print(
+                        f"{label:<10}{engine:<9}{iterations:>9}"
+                        f"{'on' if tail_calls else 'off':>6}{elapsed:>8.2f}s"
+                        f"{peak:>9.1f}  {result}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
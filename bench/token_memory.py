@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+import regex_scanner
+import token_buffer
+from parser import Parser
+
+
+def synthetic_source(size: int) -> str:
+    chunk = (
+        "fun helper_function(first, second) {\n"
+        '    var message = "generated string literal";\n'
+        "    if (first >= second and second != 12.5) return first * 3 - second;\n"
+        "    return helper_function(second, first / 2);\n"
+        "}\n"
+    )
+    return chunk * (size // len(chunk) + 1)
+
+
+def traced(action):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    source = synthetic_source(2_000_000)
+    print(f"source: {len(source) / 1e6:.1f} MB")
+
+    engines = [
+        ("Token list", lambda: regex_scanner.RegexScanner(source).scanTokens()),
+        ("TokenBuffer", lambda: token_buffer.CompactScanner(source).scanTokens()),
+    ]
+    for label, scan in engines:
+        tokens, retained, elapsed = traced(scan)
+        print(
+            f"{label:<12}{len(tokens):>10} tokens"
+            f"{retained / len(tokens):>10.1f} bytes/token"
+            f"{elapsed:>10.2f} s scan"
+        )
+
+        start = time.perf_counter()
+        Parser(tokens).parse()
+        print(f"{'':<12}{time.perf_counter() - start:>39.2f} s parse")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_scanner
+
+PROGRAMS = {
+    "local reads/writes": """
+fun work() {
+  var a = 1; var b = 2; var c = 3; var total = 0;
+  var i = 0;
+  while (i < 100000) {
+    total = total + a + b + c;
+    a = b; b = c; c = a;
+    i = i + 1;
+  }
+  return total;
+}
+print work();
+""",
+    "closure upvalues": """
+fun make() {
+  var count = 0;
+  var step = 1;
+  fun bump() {
+    var j = 0;
+    while (j < 10) { count = count + step; j = j + 1; }
+    return count;
+  }
+  return bump;
+}
+var bump = make();
+for (var i = 0; i < 10000; i = i + 1) bump();
+print bump();
+""",
+    "globals": """
+var total = 0;
+var i = 0;
+while (i < 100000) {
+  total = total + i;
+  i = i + 1;
+}
+print total;
+""",
+}
+
+
+def main():
+    print(f"{'program':<22}{'best of 3':>12}")
+    for label, source in PROGRAMS.items():
+        best = None
+        for _ in range(3):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                main_scanner.run(source)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:<22}{best:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+import time
+import tracemalloc
+from typing import Callable, Optional
+import runtime_error
+import tokens as ts
+
+# Steps taken between checks of the clock and of memory use.
+CHECK_INTERVAL = 1024
+
+
+class Budget:
+    """Limits on how much one run of a program may do, for running scripts
+    that are not trusted to terminate.
+
+    Engines call tick at every loop iteration and every Lox function call,
+    which is enough to catch any runaway loop or recursion; each tick is one
+    step. Every engine ticks at the same points, a loop's back-edge and the
+    entry to a function, and gives the loop's line or the call's, so a run
+    stops at the same step and line whichever engine runs it. Going over a limit raises a Lox runtime error, so the run ends the
+    way any other runtime error ends it.
+
+    The heap limit is measured with tracemalloc, which the budget turns on
+    for the run if nothing else has, and which slows allocation down while
+    it is on. It covers every Python object the run allocates: environments,
+    instances, strings and the rest.
+    """
+
+    def __init__(
+        self,
+        max_steps: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        max_heap: Optional[int] = None,
+    ):
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.max_heap = max_heap
+        self.steps = 0
+        self.next_check = 0
+        self.deadline = None
+        self.heap_baseline = 0
+        self.started_tracing = False
+
+    def start(self) -> None:
+        self.steps = 0
+        if self.max_seconds is not None:
+            self.deadline = time.perf_counter() + self.max_seconds
+        if self.max_heap is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            self.heap_baseline = tracemalloc.get_traced_memory()[0]
+        self.schedule_check()
+
+    def finish(self) -> None:
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def schedule_check(self) -> None:
+        self.next_check = self.steps + CHECK_INTERVAL
+        if self.max_steps is not None:
+            self.next_check = min(self.next_check, self.max_steps + 1)
+
+    def tick(self, line: int) -> None:
+        self.steps += 1
+        if self.steps >= self.next_check:
+            self.check(line)
+
+    def tick_lazily(self, line_of: Callable[[], int]) -> None:
+        """tick, for callers whose line is costly to work out: line_of is
+        only called when the step is one the budget checks."""
+        self.steps += 1
+        if self.steps >= self.next_check:
+            self.check(line_of())
+
+    def check(self, line: int) -> None:
+        if self.max_steps is not None and self.steps > self.max_steps:
+            self.exceeded(line, f"Step budget of {self.max_steps} exceeded.")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.exceeded(line, f"Time budget of {self.max_seconds}s exceeded.")
+        if self.max_heap is not None and tracemalloc.is_tracing():
+            heap = tracemalloc.get_traced_memory()[0] - self.heap_baseline
+            if heap > self.max_heap:
+                self.exceeded(line, f"Heap budget of {self.max_heap} bytes exceeded.")
+        self.schedule_check()
+
+    def exceeded(self, line: int, message: str):
+        raise runtime_error.RuntimeError(ts.Token(None, "", None, line), message)
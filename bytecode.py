@@ -0,0 +1,187 @@
+from __future__ import annotations
+import enum
+from typing import Any, List
+
+
+class OpCode(enum.IntEnum):
+    CONSTANT = 0
+    NIL = 1
+    TRUE = 2
+    FALSE = 3
+    POP = 4
+    GET_LOCAL = 5
+    SET_LOCAL = 6
+    GET_GLOBAL = 7
+    DEFINE_GLOBAL = 8
+    SET_GLOBAL = 9
+    GET_UPVALUE = 10
+    SET_UPVALUE = 11
+    GET_PROPERTY = 12
+    SET_PROPERTY = 13
+    GET_SUPER = 14
+    EQUAL = 15
+    NOT_EQUAL = 16
+    GREATER = 17
+    GREATER_EQUAL = 18
+    LESS = 19
+    LESS_EQUAL = 20
+    ADD = 21
+    SUBTRACT = 22
+    MULTIPLY = 23
+    DIVIDE = 24
+    NOT = 25
+    NEGATE = 26
+    PRINT = 27
+    JUMP = 28
+    JUMP_IF_FALSE = 29
+    LOOP = 30
+    CALL = 31
+    INVOKE = 32
+    SUPER_INVOKE = 33
+    CLOSURE = 34
+    CLOSE_UPVALUE = 35
+    RETURN = 36
+    CLASS = 37
+    TAIL_CALL = 38
+    TAIL_INVOKE = 39
+
+
+# Number of inline operands following each opcode. CLOSURE is followed by a
+# further (is_local, index) pair per captured upvalue.
+OPERAND_COUNTS = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.LOOP: 1,
+    OpCode.CALL: 1,
+    OpCode.INVOKE: 2,
+    OpCode.SUPER_INVOKE: 2,
+    OpCode.CLOSURE: 1,
+    OpCode.CLASS: 3,
+    OpCode.TAIL_CALL: 1,
+    OpCode.TAIL_INVOKE: 2,
+}
+
+
+class Chunk:
+    """A compiled function body: a flat list of opcodes and their operands,
+    the source line of every entry and a constant pool."""
+
+    def __init__(self):
+        self.code = []
+        self.lines = []
+        self.constants = []
+        self.constant_indexes = {}
+
+    def write(self, value: int, line: int) -> int:
+        self.code.append(value)
+        self.lines.append(line)
+        return len(self.code) - 1
+
+    def add_constant(self, value: Any) -> int:
+        # Keyed on the type as well, since True == 1.0 for dict lookups.
+        try:
+            key = (type(value), value)
+            index = self.constant_indexes.get(key)
+        except TypeError:
+            key = None
+            index = None
+
+        if index is None:
+            self.constants.append(value)
+            index = len(self.constants) - 1
+            if key is not None:
+                self.constant_indexes[key] = index
+        return index
+
+
+class FunctionProto:
+    def __init__(self, name: str, arity: int, is_initializer: bool = False):
+        self.name = name
+        self.arity = arity
+        self.is_initializer = is_initializer
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __repr__(self) -> str:
+        return f"<fn {self.name}>"
+
+
+def disassemble(function: FunctionProto) -> str:
+    output = []
+    pending = [function]
+    while pending:
+        current = pending.pop(0)
+        output.append(f"== {current.name} ==")
+        output.extend(disassemble_chunk(current.chunk))
+        output.append("")
+        pending.extend(
+            constant
+            for constant in current.chunk.constants
+            if isinstance(constant, FunctionProto)
+        )
+    return "\n".join(output)
+
+
+def disassemble_chunk(chunk: Chunk) -> List[str]:
+    lines = []
+    offset = 0
+    while offset < len(chunk.code):
+        text, offset = disassemble_instruction(chunk, offset)
+        lines.append(text)
+    return lines
+
+
+def disassemble_instruction(chunk: Chunk, offset: int):
+    op = OpCode(chunk.code[offset])
+    line = chunk.lines[offset]
+    if offset > 0 and chunk.lines[offset - 1] == line:
+        prefix = f"{offset:04d}    | "
+    else:
+        prefix = f"{offset:04d} {line:4d} "
+
+    count = OPERAND_COUNTS.get(op, 0)
+    operands = chunk.code[offset + 1 : offset + 1 + count]
+    text = f"{prefix}{op.name:<16}"
+    next_offset = offset + 1 + count
+
+    if op in (OpCode.JUMP, OpCode.JUMP_IF_FALSE):
+        text += f"{offset} -> {next_offset + operands[0]}"
+    elif op == OpCode.LOOP:
+        text += f"{offset} -> {next_offset - operands[0]}"
+    elif op in (OpCode.GET_LOCAL, OpCode.SET_LOCAL, OpCode.CALL, OpCode.TAIL_CALL):
+        text += f"{operands[0]}"
+    elif op in (OpCode.GET_UPVALUE, OpCode.SET_UPVALUE):
+        text += f"{operands[0]}"
+    elif op in (OpCode.INVOKE, OpCode.SUPER_INVOKE, OpCode.TAIL_INVOKE):
+        name, argc = operands
+        text += f"({argc} args) {name:4d} '{chunk.constants[name]}'"
+    elif op == OpCode.CLASS:
+        name, method_count, has_superclass = operands
+        text += (
+            f"{name:4d} '{chunk.constants[name]}' "
+            f"{method_count} methods{' < super' if has_superclass else ''}"
+        )
+    elif op == OpCode.CLOSURE:
+        function = chunk.constants[operands[0]]
+        text += f"{operands[0]:4d} {function!r}"
+        for i in range(function.upvalue_count):
+            is_local = chunk.code[next_offset]
+            index = chunk.code[next_offset + 1]
+            kind = "local" if is_local else "upvalue"
+            text += f"\n{next_offset:04d}    |   {kind} {index}"
+            next_offset += 2
+    elif count == 1:
+        text += f"{operands[0]:4d} '{chunk.constants[operands[0]]}'"
+
+    return text, next_offset
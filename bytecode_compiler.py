@@ -0,0 +1,398 @@
+from __future__ import annotations
+import enum
+from typing import List, Optional
+import expr
+import stmt
+import tokens as ts
+from bytecode import FunctionProto, OpCode
+from expr import Get, Super
+
+
+class FunctionType(enum.Enum):
+    SCRIPT = 0
+    FUNCTION = 1
+    INITIALIZER = 2
+    METHOD = 3
+
+
+class Local:
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class FunctionState:
+    def __init__(
+        self,
+        enclosing: Optional[FunctionState],
+        function: FunctionProto,
+        type: FunctionType,
+    ):
+        self.enclosing = enclosing
+        self.function = function
+        self.type = type
+        self.upvalues = []
+        self.scope_depth = 0
+        # Slot 0 of every frame holds the callee, or the receiver in methods.
+        if type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            self.locals = [Local("this", 0)]
+        else:
+            self.locals = [Local("", 0)]
+
+    def resolve_local(self, name: str) -> int:
+        for i in range(len(self.locals) - 1, -1, -1):
+            if self.locals[i].name == name:
+                return i
+        return -1
+
+    def resolve_upvalue(self, name: str) -> int:
+        if self.enclosing is None:
+            return -1
+
+        local = self.enclosing.resolve_local(name)
+        if local != -1:
+            self.enclosing.locals[local].is_captured = True
+            return self.add_upvalue(True, local)
+
+        upvalue = self.enclosing.resolve_upvalue(name)
+        if upvalue != -1:
+            return self.add_upvalue(False, upvalue)
+        return -1
+
+    def add_upvalue(self, is_local: bool, index: int) -> int:
+        upvalue = (is_local, index)
+        if upvalue in self.upvalues:
+            return self.upvalues.index(upvalue)
+        self.upvalues.append(upvalue)
+        return len(self.upvalues) - 1
+
+
+class BytecodeCompiler(expr.Visitor, stmt.StmtVisitor):
+    """Compiles a resolved statement list into FunctionProto bytecode for vm.VM.
+
+    Variable resolution mirrors clox: locals live in stack slots of the frame,
+    variables of enclosing functions are reached through upvalues and
+    everything else is a global looked up by name. The resolver has already
+    reported any static errors, so none are checked again here.
+    """
+
+    def __init__(self, tail_calls: bool = True):
+        self.state = None
+        self.line = 0
+        self.tail_calls = tail_calls
+
+    def compile(self, statements: List[stmt.Stmt]) -> FunctionProto:
+        script = FunctionProto("script", 0)
+        self.state = FunctionState(None, script, FunctionType.SCRIPT)
+        for statement in statements:
+            statement.accept(self)
+        self.emit_return()
+        return self.state.function
+
+    def emit(self, *values: int) -> int:
+        chunk = self.state.function.chunk
+        for value in values:
+            index = chunk.write(value, self.line)
+        return index
+
+    def emit_constant_op(self, op: OpCode, value) -> None:
+        self.emit(op, self.state.function.chunk.add_constant(value))
+
+    def emit_jump(self, op: OpCode) -> int:
+        return self.emit(op, 0)
+
+    def patch_jump(self, operand: int) -> None:
+        code = self.state.function.chunk.code
+        code[operand] = len(code) - (operand + 1)
+
+    def emit_loop(self, loop_start: int) -> None:
+        code = self.state.function.chunk.code
+        self.emit(OpCode.LOOP, len(code) + 2 - loop_start)
+
+    def emit_return(self) -> None:
+        if self.state.type == FunctionType.INITIALIZER:
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def begin_scope(self) -> None:
+        self.state.scope_depth += 1
+
+    def end_scope(self) -> None:
+        state = self.state
+        state.scope_depth -= 1
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals.pop().is_captured:
+                self.emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emit(OpCode.POP)
+
+    def add_local(self, name: str) -> int:
+        self.state.locals.append(Local(name, self.state.scope_depth))
+        return len(self.state.locals) - 1
+
+    def define_variable(self, name: str) -> None:
+        if self.state.scope_depth > 0:
+            self.add_local(name)
+        else:
+            self.emit_constant_op(OpCode.DEFINE_GLOBAL, name)
+
+    def named_variable(self, name: str, value: Optional[expr.Expr] = None) -> None:
+        state = self.state
+        slot = state.resolve_local(name)
+        if slot != -1:
+            get_op, set_op = OpCode.GET_LOCAL, OpCode.SET_LOCAL
+        else:
+            slot = state.resolve_upvalue(name)
+            if slot != -1:
+                get_op, set_op = OpCode.GET_UPVALUE, OpCode.SET_UPVALUE
+            else:
+                slot = state.function.chunk.add_constant(name)
+                get_op, set_op = OpCode.GET_GLOBAL, OpCode.SET_GLOBAL
+
+        if value is None:
+            self.emit(get_op, slot)
+        else:
+            value.accept(self)
+            self.emit(set_op, slot)
+
+    def function(self, declaration: stmt.Function, type: FunctionType) -> None:
+        function = FunctionProto(
+            declaration.name.lexeme,
+            len(declaration.params),
+            type == FunctionType.INITIALIZER,
+        )
+        state = FunctionState(self.state, function, type)
+        self.state = state
+        self.begin_scope()
+        for param in declaration.params:
+            self.add_local(param.lexeme)
+        for statement in declaration.body:
+            statement.accept(self)
+        self.emit_return()
+        self.state = state.enclosing
+
+        function.upvalue_count = len(state.upvalues)
+        self.line = declaration.name.line
+        self.emit_constant_op(OpCode.CLOSURE, function)
+        for is_local, index in state.upvalues:
+            self.emit(1 if is_local else 0, index)
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> None:
+        self.begin_scope()
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.end_scope()
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        self.line = stmt.name.line
+        name = stmt.name.lexeme
+        class_slot = -1
+        if self.state.scope_depth > 0:
+            self.emit(OpCode.NIL)
+            class_slot = self.add_local(name)
+
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+            self.begin_scope()
+            self.add_local("super")
+
+        for method in stmt.methods:
+            if method.name.lexeme == "init":
+                self.function(method, FunctionType.INITIALIZER)
+            else:
+                self.function(method, FunctionType.METHOD)
+
+        self.line = stmt.name.line
+        self.emit(
+            OpCode.CLASS,
+            self.state.function.chunk.add_constant(name),
+            len(stmt.methods),
+            1 if stmt.superclass is not None else 0,
+        )
+        if class_slot != -1:
+            self.emit(OpCode.SET_LOCAL, class_slot, OpCode.POP)
+        else:
+            self.emit_constant_op(OpCode.DEFINE_GLOBAL, name)
+
+        if stmt.superclass is not None:
+            self.end_scope()
+
+    def visit_expression_stmt(self, stmt: stmt.Expression) -> None:
+        stmt.expression.accept(self)
+        self.emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        self.line = stmt.name.line
+        if self.state.scope_depth > 0:
+            # Declared before the body is compiled so the function can
+            # refer to itself.
+            self.add_local(stmt.name.lexeme)
+            self.function(stmt, FunctionType.FUNCTION)
+        else:
+            self.function(stmt, FunctionType.FUNCTION)
+            self.emit_constant_op(OpCode.DEFINE_GLOBAL, stmt.name.lexeme)
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> None:
+        stmt.expression.accept(self)
+        self.emit(OpCode.PRINT)
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> None:
+        self.line = stmt.name.line
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        else:
+            self.emit(OpCode.NIL)
+        self.define_variable(stmt.name.lexeme)
+
+    def visit_if_stmt(self, stmt: stmt.If) -> None:
+        stmt.condition.accept(self)
+        then_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        stmt.thenBranch.accept(self)
+        else_jump = self.emit_jump(OpCode.JUMP)
+        self.patch_jump(then_jump)
+        self.emit(OpCode.POP)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+        self.patch_jump(else_jump)
+
+    def visit_while_stmt(self, stmt: stmt.While) -> None:
+        loop_start = len(self.state.function.chunk.code)
+        stmt.condition.accept(self)
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        stmt.body.accept(self)
+        # The budget check at the back-edge reports the loop's line.
+        self.line = stmt.line
+        self.emit_loop(loop_start)
+        self.patch_jump(exit_jump)
+        self.emit(OpCode.POP)
+
+    def visit_return_stmt(self, stmt: stmt.Return) -> None:
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emit_return()
+        elif stmt.tail_call and self.tail_calls:
+            # The VM reuses the current frame for a TAIL_CALL or TAIL_INVOKE
+            # of a Lox function; other callees fall through to the RETURN.
+            self.call(stmt.value, tail=True)
+            self.emit(OpCode.RETURN)
+        else:
+            stmt.value.accept(self)
+            self.emit(OpCode.RETURN)
+
+    def visit_assign_expr(self, expr: expr.Assign) -> None:
+        self.line = expr.name.line
+        self.named_variable(expr.name.lexeme, expr.value)
+
+    def visit_binary_expr(self, expr: expr.Binary) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+        self.line = expr.operator.line
+        self.emit(BINARY_OPS[expr.operator.type])
+
+    def visit_call_expr(self, expr: expr.Call) -> None:
+        self.call(expr)
+
+    def call(self, expr: expr.Call, tail: bool = False) -> None:
+        callee = expr.callee
+        if isinstance(callee, Get):
+            callee.object.accept(self)
+            for argument in expr.arguments:
+                argument.accept(self)
+            self.line = expr.paren.line
+            name = self.state.function.chunk.add_constant(callee.name.lexeme)
+            op = OpCode.TAIL_INVOKE if tail else OpCode.INVOKE
+            self.emit(op, name, len(expr.arguments))
+        elif isinstance(callee, Super):
+            self.named_variable("this")
+            for argument in expr.arguments:
+                argument.accept(self)
+            self.named_variable("super")
+            self.line = expr.paren.line
+            name = self.state.function.chunk.add_constant(callee.method.lexeme)
+            self.emit(OpCode.SUPER_INVOKE, name, len(expr.arguments))
+        else:
+            callee.accept(self)
+            for argument in expr.arguments:
+                argument.accept(self)
+            self.line = expr.paren.line
+            self.emit(OpCode.TAIL_CALL if tail else OpCode.CALL, len(expr.arguments))
+
+    def visit_get_expr(self, expr: expr.Get) -> None:
+        expr.object.accept(self)
+        self.line = expr.name.line
+        self.emit_constant_op(OpCode.GET_PROPERTY, expr.name.lexeme)
+
+    def visit_set_expr(self, expr: expr.Set) -> None:
+        expr.object.accept(self)
+        expr.value.accept(self)
+        self.line = expr.name.line
+        self.emit_constant_op(OpCode.SET_PROPERTY, expr.name.lexeme)
+
+    def visit_grouping_expr(self, expr: expr.Grouping) -> None:
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr: expr.Literal) -> None:
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit_constant_op(OpCode.CONSTANT, expr.value)
+
+    def visit_logical_expr(self, expr: expr.Logical) -> None:
+        expr.left.accept(self)
+        if expr.operator.type == ts.TokenType.AND:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            self.emit(OpCode.POP)
+            expr.right.accept(self)
+            self.patch_jump(end_jump)
+        else:
+            else_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            end_jump = self.emit_jump(OpCode.JUMP)
+            self.patch_jump(else_jump)
+            self.emit(OpCode.POP)
+            expr.right.accept(self)
+            self.patch_jump(end_jump)
+
+    def visit_super_expr(self, expr: expr.Super) -> None:
+        self.line = expr.keyword.line
+        self.named_variable("this")
+        self.named_variable("super")
+        self.emit_constant_op(OpCode.GET_SUPER, expr.method.lexeme)
+
+    def visit_this_expr(self, expr: expr.This) -> None:
+        self.line = expr.keyword.line
+        self.named_variable("this")
+
+    def visit_unary_expr(self, expr: expr.Unary) -> None:
+        expr.right.accept(self)
+        self.line = expr.operator.line
+        if expr.operator.type == ts.TokenType.BANG:
+            self.emit(OpCode.NOT)
+        else:
+            self.emit(OpCode.NEGATE)
+
+    def visit_variable_expr(self, expr: expr.Variable) -> None:
+        self.line = expr.name.line
+        self.named_variable(expr.name.lexeme)
+
+
+BINARY_OPS = {
+    ts.TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    ts.TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    ts.TokenType.GREATER: OpCode.GREATER,
+    ts.TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    ts.TokenType.LESS: OpCode.LESS,
+    ts.TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    ts.TokenType.PLUS: OpCode.ADD,
+    ts.TokenType.MINUS: OpCode.SUBTRACT,
+    ts.TokenType.STAR: OpCode.MULTIPLY,
+    ts.TokenType.SLASH: OpCode.DIVIDE,
+}
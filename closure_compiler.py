@@ -0,0 +1,782 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, List, Tuple
+import expr
+from expr import GLOBAL
+import stmt
+import tokens as ts
+import main_scanner
+import runtime_error
+from environment import Environment
+from lox_callable import LoxCallable
+from lox_class import LoxClass
+from lox_function import LoxBoundMethod
+from lox_instance import LoxInstance
+from lox_string import STRING_TYPES, concat
+from return_exception_type import TailCall
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+
+# Compiled expressions are closures taking the current Environment and
+# returning a value. Compiled statements take the Environment and return None
+# to fall through, a one-element tuple holding the value of a "return", or a
+# TailCall for a "return" of a call in tail position.
+ExprCode = Callable[[Environment], Any]
+StmtCode = Callable[[Environment], Any]
+
+
+class FunctionTemplate:
+    def __init__(self, name: str, arity: int, body: StmtCode, is_initializer: bool):
+        self.name = name
+        self.arity = arity
+        self.body = body
+        self.is_initializer = is_initializer
+
+
+class CompiledFunction(LoxCallable):
+    __slots__ = ("template", "closure", "body", "is_initializer")
+
+    def __init__(self, template: FunctionTemplate, closure: Environment):
+        self.template = template
+        self.closure = closure
+        self.body = template.body
+        self.is_initializer = template.is_initializer
+
+    def bind(self, instance: LoxInstance) -> LoxBoundMethod:
+        return LoxBoundMethod(instance, self)
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        # As in LoxFunction, a method's receiver is the first argument.
+        environment = Environment(self.closure, arguments)
+        counters = interpreter.counters
+        counters.calls += 1
+        counters.environments += 1
+        result = self.body(environment)
+        if self.is_initializer:
+            return environment.values[0]
+        if result is None:
+            return None
+        if type(result) is TailCall:
+            return finish_tail_call(result, interpreter)
+        return result[0]
+
+    def arity(self) -> int:
+        return self.template.arity
+
+    def __repr__(self) -> str:
+        return self.to_string()
+
+    def to_string(self) -> str:
+        return f"<fn {self.template.name}>"
+
+
+class ClosureCompiler:
+    """Compiles a resolved statement list into nested Python closures.
+
+    Each node is visited once, ahead of time, and turned into a closure that
+    is specialised for its operator and for how its variables were resolved,
+    so running the program involves no visitor dispatch at all. Semantics,
+    runtime values and natives are shared with the tree-walking Interpreter
+    passed in.
+    """
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        self.globals = interpreter.globals.values
+        self.scope_depth = 0
+
+    def compile(self, statements: List[stmt.Stmt]) -> StmtCode:
+        return self.compile_block(statements)
+
+    def compile_block(self, statements: List[stmt.Stmt]) -> StmtCode:
+        codes = tuple(self.compile_stmt(statement) for statement in statements)
+        if len(codes) == 1:
+            return codes[0]
+
+        def block(environment):
+            for code in codes:
+                result = code(environment)
+                if result is not None:
+                    return result
+            return None
+
+        return block
+
+    def compile_stmt(self, statement: stmt.Stmt) -> StmtCode:
+        return getattr(self, "stmt_" + type(statement).__name__.lower())(statement)
+
+    def compile_expr(self, expression: expr.Expr) -> ExprCode:
+        return getattr(self, "expr_" + type(expression).__name__.lower())(expression)
+
+    def stmt_expression(self, statement: stmt.Expression) -> StmtCode:
+        expression = self.compile_expr(statement.expression)
+
+        def expression_statement(environment):
+            expression(environment)
+
+        return expression_statement
+
+    def stmt_print(self, statement: stmt.Print) -> StmtCode:
+        expression = self.compile_expr(statement.expression)
+        stringify = self.interpreter.stringify
+        write_line = self.interpreter.output.write_line
+
+        def print_statement(environment):
+            write_line(stringify(expression(environment)))
+
+        return print_statement
+
+    def stmt_var(self, statement: stmt.Var) -> StmtCode:
+        name = statement.name.lexeme
+        initializer = None
+        if statement.initializer is not None:
+            initializer = self.compile_expr(statement.initializer)
+
+        if self.scope_depth == 0:
+            globals = self.globals
+
+            def define_global(environment):
+                value = None if initializer is None else initializer(environment)
+                globals[name] = value
+
+            return define_global
+
+        def define_local(environment):
+            environment.values.append(
+                None if initializer is None else initializer(environment)
+            )
+
+        return define_local
+
+    def stmt_block(self, statement: stmt.Block) -> StmtCode:
+        self.scope_depth += 1
+        body = self.compile_block(statement.statements)
+        self.scope_depth -= 1
+        counters = self.interpreter.counters
+
+        def block_statement(environment):
+            counters.environments += 1
+            return body(Environment(environment, []))
+
+        return block_statement
+
+    def stmt_if(self, statement: stmt.If) -> StmtCode:
+        condition = self.compile_expr(statement.condition)
+        then_branch = self.compile_stmt(statement.thenBranch)
+        if statement.elseBranch is None:
+
+            def if_statement(environment):
+                if condition(environment):
+                    return then_branch(environment)
+                return None
+
+            return if_statement
+
+        else_branch = self.compile_stmt(statement.elseBranch)
+
+        def if_else_statement(environment):
+            if condition(environment):
+                return then_branch(environment)
+            return else_branch(environment)
+
+        return if_else_statement
+
+    def stmt_while(self, statement: stmt.While) -> StmtCode:
+        condition = self.compile_expr(statement.condition)
+        body = self.compile_stmt(statement.body)
+        budget = self.interpreter.budget
+
+        if budget is not None:
+            line = statement.line
+
+            def budgeted_while_statement(environment):
+                while condition(environment):
+                    result = body(environment)
+                    if result is not None:
+                        return result
+                    budget.tick(line)
+                return None
+
+            return budgeted_while_statement
+
+        def while_statement(environment):
+            while condition(environment):
+                result = body(environment)
+                if result is not None:
+                    return result
+            return None
+
+        return while_statement
+
+    def stmt_return(self, statement: stmt.Return) -> StmtCode:
+        if statement.value is None:
+            return lambda environment: (None,)
+
+        if statement.tail_call and self.interpreter.tail_calls:
+            target = self.compile_call_target(statement.value)
+
+            def tail_call(environment):
+                return TailCall(*target(environment))
+
+            return tail_call
+
+        value = self.compile_expr(statement.value)
+        return lambda environment: (value(environment),)
+
+    def stmt_function(self, statement: stmt.Function) -> StmtCode:
+        template = self.compile_function(statement, False)
+        return self.define(
+            statement.name.lexeme,
+            lambda environment: CompiledFunction(template, environment),
+        )
+
+    def stmt_class(self, statement: stmt.Class) -> StmtCode:
+        name = statement.name.lexeme
+        superclass_code = None
+        if statement.superclass is not None:
+            superclass_code = self.compile_expr(statement.superclass)
+            superclass_token = statement.superclass.name
+        counters = self.interpreter.counters
+
+        templates = [
+            self.compile_function(method, method.name.lexeme == "init")
+            for method in statement.methods
+        ]
+
+        def make_class(environment):
+            superclass = None
+            if superclass_code is not None:
+                superclass = superclass_code(environment)
+                if not isinstance(superclass, LoxClass):
+                    raise runtime_error.RuntimeError(
+                        superclass_token, "Superclass must be a class."
+                    )
+                environment = Environment(environment, [superclass])
+                counters.environments += 1
+
+            methods = {
+                template.name: CompiledFunction(template, environment)
+                for template in templates
+            }
+            return LoxClass(name, superclass, methods)
+
+        return self.define(name, make_class)
+
+    def define(self, name: str, make_value: ExprCode) -> StmtCode:
+        if self.scope_depth == 0:
+            globals = self.globals
+
+            def define_global(environment):
+                globals[name] = make_value(environment)
+
+            return define_global
+
+        def define_local(environment):
+            # Reserve the slot first: the value may capture this environment.
+            values = environment.values
+            slot = len(values)
+            values.append(None)
+            values[slot] = make_value(environment)
+
+        return define_local
+
+    def compile_function(
+        self, declaration: stmt.Function, is_initializer: bool
+    ) -> FunctionTemplate:
+        self.scope_depth += 1
+        body = self.compile_block(declaration.body)
+        self.scope_depth -= 1
+
+        interpreter = self.interpreter
+        budget = interpreter.budget
+        if budget is not None:
+            unbudgeted_body = body
+
+            def body(environment):
+                budget.tick(interpreter.call_line)
+                return unbudgeted_body(environment)
+
+        return FunctionTemplate(
+            declaration.name.lexeme, len(declaration.params), body, is_initializer
+        )
+
+    def expr_literal(self, expression: expr.Literal) -> ExprCode:
+        value = expression.value
+        return lambda environment: value
+
+    def expr_grouping(self, expression: expr.Grouping) -> ExprCode:
+        return self.compile_expr(expression.expression)
+
+    def expr_variable(self, expression: expr.Variable) -> ExprCode:
+        return self.variable_reader(expression.name, expression.depth, expression.slot)
+
+    def expr_this(self, expression: expr.This) -> ExprCode:
+        return self.variable_reader(
+            expression.keyword, expression.depth, expression.slot
+        )
+
+    def variable_reader(self, name: ts.Token, depth: int, slot: int) -> ExprCode:
+        if depth == GLOBAL:
+            globals = self.globals
+            lexeme = name.lexeme
+
+            def read_global(environment):
+                if lexeme in globals:
+                    return globals[lexeme]
+                raise runtime_error.RuntimeError(
+                    name, "Undefined variable '" + lexeme + "'."
+                )
+
+            return read_global
+
+        if depth == 0:
+            return lambda environment: environment.values[slot]
+        if depth == 1:
+            return lambda environment: environment.enclosing.values[slot]
+        if depth == 2:
+            return lambda environment: environment.enclosing.enclosing.values[slot]
+        return lambda environment: environment.get_at(depth, slot)
+
+    def expr_assign(self, expression: expr.Assign) -> ExprCode:
+        value_code = self.compile_expr(expression.value)
+        depth = expression.depth
+        slot = expression.slot
+
+        if depth == GLOBAL:
+            globals = self.globals
+            name = expression.name
+
+            def assign_global(environment):
+                value = value_code(environment)
+                if name.lexeme not in globals:
+                    raise runtime_error.RuntimeError(
+                        name, "Undefined variable '" + name.lexeme + "'."
+                    )
+                globals[name.lexeme] = value
+                return value
+
+            return assign_global
+
+        if depth == 0:
+
+            def assign_local(environment):
+                value = environment.values[slot] = value_code(environment)
+                return value
+
+            return assign_local
+
+        def assign_enclosing(environment):
+            value = value_code(environment)
+            environment.assign_at(depth, slot, value)
+            return value
+
+        return assign_enclosing
+
+    def expr_logical(self, expression: expr.Logical) -> ExprCode:
+        left = self.compile_expr(expression.left)
+        right = self.compile_expr(expression.right)
+
+        if expression.operator.type == ts.TokenType.OR:
+
+            def logical_or(environment):
+                value = left(environment)
+                if value:
+                    return value
+                return right(environment)
+
+            return logical_or
+
+        def logical_and(environment):
+            value = left(environment)
+            if not value:
+                return value
+            return right(environment)
+
+        return logical_and
+
+    def expr_unary(self, expression: expr.Unary) -> ExprCode:
+        right = self.compile_expr(expression.right)
+
+        if expression.operator.type == ts.TokenType.BANG:
+            stringify = self.interpreter.stringify
+            return lambda environment: stringify(not right(environment))
+        if expression.operator.type == ts.TokenType.MINUS:
+            operator = expression.operator
+            negate = self.interpreter.negate
+
+            def negative(environment):
+                value = right(environment)
+                if type(value) is float:
+                    return -value
+                return negate(operator, value)
+
+            return negative
+        return lambda environment: None
+
+    def expr_binary(self, expression: expr.Binary) -> ExprCode:
+        left = self.compile_expr(expression.left)
+        right = self.compile_expr(expression.right)
+        operator = expression.operator
+        generic = self.interpreter.binary_operation
+        operator_type = operator.type
+
+        # Each operator gets its own closure with an inline fast path for the
+        # common operand types; anything else goes through the interpreter's
+        # generic implementation so errors and coercions stay identical.
+        if operator_type == ts.TokenType.PLUS:
+
+            def add(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a + b
+                if type(a) in STRING_TYPES and type(b) in STRING_TYPES:
+                    return concat(a, b)
+                return generic(operator, a, b)
+
+            return add
+
+        if operator_type == ts.TokenType.MINUS:
+
+            def subtract(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a - b
+                return generic(operator, a, b)
+
+            return subtract
+
+        if operator_type == ts.TokenType.STAR:
+
+            def multiply(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a * b
+                return generic(operator, a, b)
+
+            return multiply
+
+        if operator_type == ts.TokenType.LESS:
+
+            def less(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a < b
+                return generic(operator, a, b)
+
+            return less
+
+        if operator_type == ts.TokenType.LESS_EQUAL:
+
+            def less_equal(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a <= b
+                return generic(operator, a, b)
+
+            return less_equal
+
+        if operator_type == ts.TokenType.GREATER:
+
+            def greater(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a > b
+                return generic(operator, a, b)
+
+            return greater
+
+        if operator_type == ts.TokenType.GREATER_EQUAL:
+
+            def greater_equal(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a >= b
+                return generic(operator, a, b)
+
+            return greater_equal
+
+        if operator_type == ts.TokenType.EQUAL_EQUAL:
+
+            def equal(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a == b
+                return generic(operator, a, b)
+
+            return equal
+
+        if operator_type == ts.TokenType.BANG_EQUAL:
+
+            def not_equal(environment):
+                a = left(environment)
+                b = right(environment)
+                if type(a) is float and type(b) is float:
+                    return a != b
+                return generic(operator, a, b)
+
+            return not_equal
+
+        return lambda environment: generic(
+            operator, left(environment), right(environment)
+        )
+
+    def expr_call(self, expression: expr.Call) -> ExprCode:
+        if type(expression.callee) in (expr.Get, expr.Super):
+            return self.compile_invoke(expression)
+
+        callee_code = self.compile_expr(expression.callee)
+        argument_codes = tuple(self.compile_expr(a) for a in expression.arguments)
+        paren = expression.paren
+        interpreter = self.interpreter
+        counters = interpreter.counters
+        budgeted = interpreter.budget is not None
+
+        def call(environment):
+            callee = callee_code(environment)
+            arguments = [argument(environment) for argument in argument_codes]
+            if budgeted:
+                interpreter.call_line = paren.line
+
+            if type(callee) is CompiledFunction:
+                template = callee.template
+                if len(arguments) != template.arity:
+                    raise runtime_error.RuntimeError(
+                        paren,
+                        f"Expected {template.arity} arguments "
+                        f"but got {len(arguments)}.",
+                    )
+                counters.calls += 1
+                counters.environments += 1
+                try:
+                    result = template.body(Environment(callee.closure, arguments))
+                except RecursionError:
+                    raise runtime_error.RuntimeError(
+                        paren, "Stack overflow."
+                    ) from None
+                if result is None:
+                    return None
+                if type(result) is TailCall:
+                    try:
+                        return finish_tail_call(result, interpreter)
+                    except RecursionError:
+                        raise runtime_error.RuntimeError(
+                            paren, "Stack overflow."
+                        ) from None
+                return result[0]
+
+            check_call(callee, arguments, paren)
+            try:
+                return callee.call(interpreter, arguments)
+            except RecursionError:
+                raise runtime_error.RuntimeError(paren, "Stack overflow.") from None
+
+        return call
+
+    def compile_invoke(self, expression: expr.Call) -> ExprCode:
+        target = self.compile_call_target(expression)
+        paren = expression.paren
+        interpreter = self.interpreter
+
+        def invoke(environment):
+            callee, arguments = target(environment)
+            try:
+                return callee.call(interpreter, arguments)
+            except RecursionError:
+                raise runtime_error.RuntimeError(paren, "Stack overflow.") from None
+
+        return invoke
+
+    def compile_call_target(
+        self, expression: expr.Call
+    ) -> Callable[[Environment], Tuple[Any, List[Any]]]:
+        """Compiles the callee and arguments of a call into a closure that
+        returns them checked and ready to call. A method called straight off
+        a property or "super" comes back unbound, with the receiver ahead of
+        the arguments, so no bound method is built for it.
+
+        With a budget, the target also records the call's line, where the
+        Lox function called charges the budget."""
+        target = self.compile_unbudgeted_call_target(expression)
+        interpreter = self.interpreter
+        if interpreter.budget is None:
+            return target
+        line = expression.paren.line
+
+        def budgeted_target(environment):
+            result = target(environment)
+            interpreter.call_line = line
+            return result
+
+        return budgeted_target
+
+    def compile_unbudgeted_call_target(
+        self, expression: expr.Call
+    ) -> Callable[[Environment], Tuple[Any, List[Any]]]:
+        argument_codes = tuple(self.compile_expr(a) for a in expression.arguments)
+        count = len(argument_codes)
+        paren = expression.paren
+        callee = expression.callee
+
+        if type(callee) is expr.Get:
+            object_code = self.compile_expr(callee.object)
+            name = callee.name
+            lexeme = name.lexeme
+
+            def method_target(environment):
+                object = object_code(environment)
+                if not isinstance(object, LoxInstance):
+                    raise runtime_error.RuntimeError(
+                        name, "Only instances have properties."
+                    )
+                value = object.get_field(lexeme)
+                if value is not None:
+                    arguments = [argument(environment) for argument in argument_codes]
+                    check_call(value, arguments, paren)
+                    return value, arguments
+
+                method = object.get_method(name, callee)
+                arguments = [object]
+                for argument in argument_codes:
+                    arguments.append(argument(environment))
+                check_arity(method, count, paren)
+                return method, arguments
+
+            return method_target
+
+        if type(callee) is expr.Super:
+            super_code = self.compile_super(callee)
+
+            def super_target(environment):
+                object, method = super_code(environment)
+                arguments = [object]
+                for argument in argument_codes:
+                    arguments.append(argument(environment))
+                check_arity(method, count, paren)
+                return method, arguments
+
+            return super_target
+
+        callee_code = self.compile_expr(callee)
+
+        def target(environment):
+            value = callee_code(environment)
+            arguments = [argument(environment) for argument in argument_codes]
+            check_call(value, arguments, paren)
+            return value, arguments
+
+        return target
+
+    def expr_get(self, expression: expr.Get) -> ExprCode:
+        object_code = self.compile_expr(expression.object)
+        name = expression.name
+
+        def get(environment):
+            object = object_code(environment)
+            if isinstance(object, LoxInstance):
+                return object.get(name, expression)
+            raise runtime_error.RuntimeError(name, "Only instances have properties.")
+
+        return get
+
+    def expr_set(self, expression: expr.Set) -> ExprCode:
+        object_code = self.compile_expr(expression.object)
+        value_code = self.compile_expr(expression.value)
+        name = expression.name
+
+        def set(environment):
+            object = object_code(environment)
+            if not isinstance(object, LoxInstance):
+                raise runtime_error.RuntimeError(name, "Only instances have fields.")
+            value = value_code(environment)
+            object.set(name, value, expression)
+            return value
+
+        return set
+
+    def expr_super(self, expression: expr.Super) -> ExprCode:
+        super_code = self.compile_super(expression)
+
+        def super_method(environment):
+            object, method = super_code(environment)
+            return method.bind(object)
+
+        return super_method
+
+    def compile_super(
+        self, expression: expr.Super
+    ) -> Callable[[Environment], Tuple[LoxInstance, CompiledFunction]]:
+        depth = expression.depth
+        slot = expression.slot
+        method_name = expression.method
+
+        def find_super_method(environment):
+            superclass = environment.get_at(depth, slot)
+            object = environment.get_at(depth - 1, 0)
+            method = superclass.find_method(method_name.lexeme)
+            if method is None:
+                raise runtime_error.RuntimeError(
+                    method_name, "Undefined property '" + method_name.lexeme + "'."
+                )
+            return object, method
+
+        return find_super_method
+
+
+def check_call(callee: Any, arguments: List[Any], paren: ts.Token) -> None:
+    if not isinstance(callee, LoxCallable):
+        raise runtime_error.RuntimeError(paren, "can only call functions and classes.")
+    check_arity(callee, len(arguments), paren)
+
+
+def check_arity(callee: LoxCallable, count: int, paren: ts.Token) -> None:
+    if count != callee.arity():
+        raise runtime_error.RuntimeError(
+            paren, f"Expected {callee.arity()} arguments but got {count}."
+        )
+
+
+def finish_tail_call(tail_call: TailCall, interpreter: Interpreter) -> Any:
+    """Runs a chain of tail calls in a loop, so tail recursion between
+    compiled functions uses constant Python stack."""
+    while True:
+        callee = tail_call.callee
+        arguments = tail_call.arguments
+        if type(callee) is LoxBoundMethod:
+            arguments = [callee.receiver, *arguments]
+            callee = callee.method
+        if type(callee) is not CompiledFunction:
+            return callee.call(interpreter, arguments)
+
+        environment = Environment(callee.closure, arguments)
+        counters = interpreter.counters
+        counters.calls += 1
+        counters.environments += 1
+        result = callee.body(environment)
+        if callee.is_initializer:
+            return environment.values[0]
+        if result is None:
+            return None
+        if type(result) is not TailCall:
+            return result[0]
+        tail_call = result
+
+
+class ClosureEngine:
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        try:
+            program = ClosureCompiler(self.interpreter).compile(statements)
+            program(self.interpreter.globals)
+        except runtime_error.RuntimeError as e:
+            main_scanner.lox_runtime_error(e)
@@ -1,31 +1,36 @@
 from __future__ import annotations
-from dis import dis
 import tokens as ts
 import runtime_error
-from typing import Any
+from typing import Any, List
 
 
 class Environment:
-    def __init__(self, enclosing: Environment = None):
-        self.enclosing = enclosing
-        self.values = {}
+    """A block scope or call frame.
 
-    def get(self, name: ts.Token) -> Any:
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
+    The resolver gives every local declaration a slot index in its scope, and
+    declarations run in the same order, so values live in a plain list and
+    reads and writes are index operations.
+    """
 
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
+    __slots__ = ("enclosing", "values")
 
-        raise runtime_error.RuntimeError(
-            name, "Undefined variable '" + name.lexeme + "'."
-        )
+    def __init__(self, enclosing: Environment = None, values: List[Any] = None):
+        self.enclosing = enclosing
+        self.values = [] if values is None else values
 
-    def get_at(self, distance: int, name: ts.Token) -> Any:
-        return self.ancestor(distance).get(name)
+    def get_at(self, distance: int, slot: int) -> Any:
+        environment = self
+        while distance:
+            environment = environment.enclosing
+            distance -= 1
+        return environment.values[slot]
 
-    def assign_at(self, distance: int, name: ts.Token, value: Any) -> None:
-        self.ancestor(distance).values[name.lexeme] = value
+    def assign_at(self, distance: int, slot: int, value: Any) -> None:
+        environment = self
+        while distance:
+            environment = environment.enclosing
+            distance -= 1
+        environment.values[slot] = value
 
     def ancestor(self, distance: int) -> Environment:
         environment = self
@@ -34,18 +39,38 @@ class Environment:
 
         return environment
 
-    def define(self, name: str, value: Any) -> None:
+    def define(self, name: str, value: Any) -> int:
+        self.values.append(value)
+        return len(self.values) - 1
+
+
+class GlobalEnvironment:
+    """The outermost scope, which the resolver does not track: globals are
+    late bound, so they stay in a dict keyed by name."""
+
+    __slots__ = ("enclosing", "values")
+
+    def __init__(self):
+        self.enclosing = None
+        self.values = {}
+
+    def get(self, name: ts.Token) -> Any:
+        if name.lexeme in self.values:
+            return self.values[name.lexeme]
+
+        raise runtime_error.RuntimeError(
+            name, "Undefined variable '" + name.lexeme + "'."
+        )
+
+    def define(self, name: str, value: Any) -> str:
         self.values[name] = value
+        return name
 
     def assign(self, name: ts.Token, value: Any) -> None:
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
             return
 
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return None
-
         raise runtime_error.RuntimeError(
             name, "Undefined variable '" + name.lexeme + "'."
         )
@@ -3,6 +3,10 @@ from abc import ABC, abstractmethod
 from tokens import Token
 from typing import List
 
+# Depth recorded on Variable, Assign, This and Super nodes that the resolver
+# did not find in any local scope: they are looked up in the globals.
+GLOBAL = -1
+
 
 class Expr(ABC):
     @abstractmethod
@@ -65,6 +69,14 @@ class Binary(Expr):
         self.left = left
         self.operator = operator
         self.right = right
+        # Set by the interpreter once it has seen the operand types at this
+        # site: a tuple of the specialised operation and the left and right
+        # operand types it applies to, or False once the site has proved too
+        # polymorphic to be worth specialising. The caches on this and the
+        # other nodes are each replaced as one tuple, so a thread running
+        # the same tree never sees half of an update.
+        self.quickened = None
+        self.deopts = 0
 
     def accept(self, visitor: Visitor):
         return visitor.visit_binary_expr(self)
@@ -84,6 +96,11 @@ class Get(Expr):
     def __init__(self, object: Expr, name: Token):
         self.object = object
         self.name = name
+        # Inline caches filled in by LoxInstance.get: (shape, slot) for a
+        # field in the last shape seen, and (class, method) for the method
+        # the last class resolved to.
+        self.cached_field = None
+        self.cached_method = None
 
     def accept(self, visitor: Visitor):
         return visitor.visit_get_expr(self)
@@ -120,15 +137,20 @@ class Set(Expr):
         self.object = object
         self.name = name
         self.value = value
+        # Inline cache filled in by LoxInstance.set_field: (shape, slot,
+        # transition).
+        self.cached_field = None
 
     def accept(self, visitor: Visitor):
-        return visitor.visit_logical_expr(self)
+        return visitor.visit_set_expr(self)
 
 
 class Super(Expr):
     def __init__(self, keyword: Token, method: Token):
         self.keyword = keyword
         self.method = method
+        self.depth = GLOBAL
+        self.slot = 0
 
     def accept(self, visitor: Visitor):
         return visitor.visit_super_expr(self)
@@ -137,6 +159,8 @@ class Super(Expr):
 class This(Expr):
     def __init__(self, keyword: Token):
         self.keyword = keyword
+        self.depth = GLOBAL
+        self.slot = 0
 
     def accept(self, visitor: Visitor):
         return visitor.visit_this_expr(self)
@@ -154,6 +178,8 @@ class Unary(Expr):
 class Variable(Expr):
     def __init__(self, name: Token):
         self.name = name
+        self.depth = GLOBAL
+        self.slot = 0
 
     def accept(self, visitor: Visitor):
         return visitor.visit_variable_expr(self)
@@ -163,6 +189,8 @@ class Assign(Expr):
     def __init__(self, name: Token, value: Expr):
         self.name = name
         self.value = value
+        self.depth = GLOBAL
+        self.slot = 0
 
     def accept(self, visitor: Visitor):
         return visitor.visit_assign_expr(self)
@@ -3,60 +3,78 @@ from lox_function import LoxFunction
 from lox_callable import LoxCallable
 from lox_class import LoxClass
 from lox_instance import LoxInstance
+from lox_string import STRING_TYPES, concat
 import main_scanner
 import expr
-import return_exception_type
+from expr import GLOBAL, Get, Super
+from return_exception_type import Return, TailCall
 import stmt
 import tokens as ts
 import environment
+import natives
+import output_sink
 import runtime_error
-from typing import List, Optional, Any
-import time
-
-
-class ClockLoxCallable(LoxCallable):
-
-    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
-        return round(time.time())
-
-    def arity(self) -> int:
-        return 0
-
-    def to_string(self) -> str:
-        return "clock: <native fn>"
+from typing import List, Optional, Any, Tuple, Union
+import operator
+
+# Operations a Binary node can be specialised to once both its operands have
+# been seen to be numbers. They agree with binary_operation for floats.
+FLOAT_OPERATIONS = {
+    ts.TokenType.PLUS: operator.add,
+    ts.TokenType.MINUS: operator.sub,
+    ts.TokenType.STAR: operator.mul,
+    ts.TokenType.SLASH: operator.truediv,
+    ts.TokenType.GREATER: operator.gt,
+    ts.TokenType.GREATER_EQUAL: operator.ge,
+    ts.TokenType.LESS: operator.lt,
+    ts.TokenType.LESS_EQUAL: operator.le,
+    ts.TokenType.EQUAL_EQUAL: operator.eq,
+    ts.TokenType.BANG_EQUAL: operator.ne,
+}
+
+# A site that loses its specialisation this many times stays generic.
+MAX_DEOPTS = 4
 
 
 class Interpreter(expr.Visitor, stmt.StmtVisitor):
-    def __init__(self):
-        self.globals = environment.Environment()
+    def __init__(self, output: Optional[output_sink.OutputSink] = None):
+        self.globals = environment.GlobalEnvironment()
         self.environment = self.globals
-        self.define_clock()
-        self.locals = {}
-
-    def define_clock(self):
-        self.globals.define("clock", ClockLoxCallable)
+        self.tail_calls = True
+        self.output = output_sink.StreamSink() if output is None else output
+        self.counters = natives.Counters()
+        # A budget.Budget, when the run has limits on how much it may do.
+        self.budget = None
+        # Line of the call about to be made, where a Lox function entered
+        # through it charges the budget. Only kept up to date with a budget.
+        self.call_line = 0
+        self.define_natives()
+
+    def define_natives(self):
+        for name, function in natives.NATIVES.items():
+            self.globals.define(name, function)
 
     def interpret(self, statements: List[stmt.Stmt]):
         try:
             for statement in statements:
                 self.execute(statement)
-        except RuntimeError as e:
+        except runtime_error.RuntimeError as e:
             main_scanner.lox_runtime_error(e)
 
-    def execute(self, stmt: stmt.Stmt) -> None:
-        stmt.accept(self)
-
-    def resolve(self, expr: expr.Expr, depth: int) -> None:
-        self.locals[expr] = depth
+    def execute(self, stmt: stmt.Stmt) -> Optional[Return]:
+        return stmt.accept(self)
 
     def execute_block(
         self, statements: List[stmt.Stmt], environment: environment.Environment
-    ) -> None:
+    ) -> Optional[Return]:
         previous = self.environment
         try:
             self.environment = environment
             for statement in statements:
-                self.execute(statement)
+                completion = statement.accept(self)
+                if completion is not None:
+                    return completion
+            return None
         finally:
             self.environment = previous
 
@@ -82,19 +100,24 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
 
     def visit_print_stmt(self, stmt: stmt.Print) -> None:
         value = self.evaluate(stmt.expression)
-        print(self.stringify(value))
+        self.output.write_line(self.stringify(value))
         return
 
-    def visit_return_stmt(self, stmt: stmt.Return) -> None:
+    def visit_return_stmt(self, stmt: stmt.Return) -> Union[Return, TailCall]:
+        if stmt.tail_call and self.tail_calls:
+            return TailCall(*self.evaluate_call(stmt.value))
+
         value = None
         if stmt.value is not None:
             value = self.evaluate(stmt.value)
 
-        raise return_exception_type.Return(value)
+        return Return(value)
 
-    def visit_block_stmt(self, stmt: stmt.Block) -> None:
-        self.execute_block(stmt.statements, environment.Environment(self.environment))
-        return None
+    def visit_block_stmt(self, stmt: stmt.Block) -> Optional[Return]:
+        self.counters.environments += 1
+        return self.execute_block(
+            stmt.statements, environment.Environment(self.environment)
+        )
 
     def visit_class_stmt(self, stmt: stmt.Class) -> None:
         superclass = None
@@ -105,11 +128,11 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
                     stmt.superclass.name, "Superclass must be a class."
                 )
 
-        self.environment.define(stmt.name.lexeme, None)
+        key = self.environment.define(stmt.name.lexeme, None)
 
         if stmt.superclass is not None:
-            self.environment = environment.Environment(self.environment)
-            self.environment.define("super", superclass)
+            self.environment = environment.Environment(self.environment, [superclass])
+            self.counters.environments += 1
 
         methods = {}
         for method in stmt.methods:
@@ -123,19 +146,25 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
         if superclass is not None:
             self.environment = self.environment.enclosing
 
-        self.environment.assign(stmt.name, klass)
+        self.environment.values[key] = klass
 
-    def visit_if_stmt(self, stmt: stmt.If) -> None:
+    def visit_if_stmt(self, stmt: stmt.If) -> Optional[Return]:
         if self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.thenBranch)
+            return self.execute(stmt.thenBranch)
         elif stmt.elseBranch is not None:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.elseBranch)
         else:
             return None
 
-    def visit_while_stmt(self, stmt: stmt.While) -> None:
+    def visit_while_stmt(self, stmt: stmt.While) -> Optional[Return]:
+        budget = self.budget
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            completion = self.execute(stmt.body)
+            if completion is not None:
+                return completion
+            # Charged at the back-edge, where the vm's LOOP charges it.
+            if budget is not None:
+                budget.tick(stmt.line)
         return None
 
     def visit_var_stmt(self, stmt: stmt.Var) -> None:
@@ -159,91 +188,161 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
     def visit_assign_expr(self, expr: expr.Assign):
         value = self.evaluate(expr.value)
 
-        distance = self.locals.get(expr)
-        if distance is not None:
-            self.environment.assign_at(distance, expr.name, value)
-        else:
+        if expr.depth == GLOBAL:
             self.globals.assign(expr.name, value)
+        else:
+            self.environment.assign_at(expr.depth, expr.slot, value)
 
         return value
 
     def visit_variable_expr(self, expr: expr.Variable):
-        return self.look_up_variable(expr.name, expr)
+        depth = expr.depth
+        if depth == GLOBAL:
+            return self.globals.get(expr.name)
+
+        environment = self.environment
+        while depth:
+            environment = environment.enclosing
+            depth -= 1
+        return environment.values[expr.slot]
 
     def look_up_variable(self, name: ts.Token, expr: expr.Expr) -> Any:
-        distance = self.locals.get(expr)
-        if distance is not None:
-            return self.environment.get_at(distance, name)
-        else:
+        if expr.depth == GLOBAL:
             return self.globals.get(name)
+        else:
+            return self.environment.get_at(expr.depth, expr.slot)
 
     def visit_binary_expr(self, expr: expr.Binary):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
 
-        if expr.operator.type == ts.TokenType.GREATER:
-            self.check_number_operands(expr.operator, left, right)
+        quickened = expr.quickened
+        if quickened:
+            operation, left_type, right_type = quickened
+            if type(left) is left_type and type(right) is right_type:
+                return operation(left, right)
+            self.deoptimise(expr)
+        elif quickened is None:
+            self.quicken(expr, left, right)
+        return self.binary_operation(expr.operator, left, right)
+
+    def quicken(self, expr: expr.Binary, left: Any, right: Any) -> None:
+        """Specialises a Binary node to the operand types it has just seen,
+        so later evaluations skip the generic checks and conversions."""
+        operation = None
+        if type(left) is float and type(right) is float:
+            operation = FLOAT_OPERATIONS.get(expr.operator.type)
+        elif (
+            type(left) in STRING_TYPES
+            and type(right) in STRING_TYPES
+            and expr.operator.type == ts.TokenType.PLUS
+        ):
+            operation = concat
+        if operation is not None:
+            expr.quickened = (operation, type(left), type(right))
+
+    def deoptimise(self, expr: expr.Binary) -> None:
+        expr.deopts += 1
+        expr.quickened = None if expr.deopts < MAX_DEOPTS else False
+
+    def binary_operation(self, operator: ts.Token, left: Any, right: Any) -> Any:
+        if operator.type == ts.TokenType.GREATER:
+            self.check_number_operands(operator, left, right)
             return float(left) > float(right)
-        elif expr.operator.type == ts.TokenType.GREATER_EQUAL:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.GREATER_EQUAL:
+            self.check_number_operands(operator, left, right)
             return float(left) >= float(right)
-        elif expr.operator.type == ts.TokenType.LESS:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.LESS:
+            self.check_number_operands(operator, left, right)
             return float(left) < float(right)
-        elif expr.operator.type == ts.TokenType.LESS_EQUAL:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.LESS_EQUAL:
+            self.check_number_operands(operator, left, right)
             return float(left) <= float(right)
-        elif expr.operator.type == ts.TokenType.BANG_EQUAL:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.BANG_EQUAL:
+            self.check_number_operands(operator, left, right)
             return not self.is_equal(left, right)
-        elif expr.operator.type == ts.TokenType.EQUAL_EQUAL:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.EQUAL_EQUAL:
+            self.check_number_operands(operator, left, right)
             return self.is_equal(left, right)
-        elif expr.operator.type == ts.TokenType.MINUS:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.MINUS:
+            self.check_number_operands(operator, left, right)
             return float(left) - float(right)
-        elif expr.operator.type == ts.TokenType.SLASH:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.SLASH:
+            self.check_number_operands(operator, left, right)
             return float(left) / float(right)
-        elif expr.operator.type == ts.TokenType.STAR:
-            self.check_number_operands(expr.operator, left, right)
+        elif operator.type == ts.TokenType.STAR:
+            self.check_number_operands(operator, left, right)
             return float(left) * float(right)
-        elif expr.operator.type == ts.TokenType.PLUS:
+        elif operator.type == ts.TokenType.PLUS:
             if (isinstance(left, float) or isinstance(left, int)) and (
                 isinstance(right, float) or isinstance(right, int)
             ):
                 return float(left) + float(right)
-            elif isinstance(left, str) and isinstance(right, str):
-                return left + right
+            elif isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+                return concat(left, right)
             raise runtime_error.RuntimeError(
-                expr.operator, "Operands must be two numbers or two strings"
+                operator, "Operands must be two numbers or two strings"
             )
 
     def visit_call_expr(self, expr: expr.Call) -> Any:
-        callee = self.evaluate(expr.callee)
-        arguments = []
+        temp_function, arguments = self.evaluate_call(expr)
+        try:
+            return temp_function.call(self, arguments)
+        except RecursionError:
+            # Each Lox call nests several Python frames here; report running
+            # out of them as a Lox error rather than a Python traceback.
+            raise runtime_error.RuntimeError(expr.paren, "Stack overflow.") from None
+
+    def evaluate_call(self, expr: expr.Call) -> Tuple[LoxCallable, List[Any]]:
+        """Evaluates the callee and arguments of a call and checks they can
+        be called, leaving the call itself to the caller.
+
+        A method called straight off a property or "super" is returned
+        unbound, with the receiver placed ahead of the arguments, so no bound
+        method is built just to be called once.
+        """
+        receiver = None
+        if type(expr.callee) is Get:
+            object = self.evaluate(expr.callee.object)
+            if not isinstance(object, LoxInstance):
+                raise runtime_error.RuntimeError(
+                    expr.callee.name, "Only instances have properties."
+                )
+            callee = object.get_field(expr.callee.name.lexeme)
+            if callee is None:
+                callee = object.get_method(expr.callee.name, expr.callee)
+                receiver = object
+        elif type(expr.callee) is Super:
+            receiver, callee = self.find_super_method(expr.callee)
+        else:
+            callee = self.evaluate(expr.callee)
+
+        arguments = [] if receiver is None else [receiver]
         for argument in expr.arguments:
             arguments.append(self.evaluate(argument))
 
         temp_function = callee
 
-        if len(arguments) != temp_function.arity():
+        if not isinstance(callee, LoxCallable):
             raise runtime_error.RuntimeError(
-                expr.paren,
-                f"Expected {temp_function.arity()} arguments but got {len(arguments)}.",
+                expr.paren, "can only call functions and classes."
             )
 
-        if not isinstance(callee, LoxCallable) and not issubclass(callee, LoxCallable):
+        if len(expr.arguments) != temp_function.arity():
             raise runtime_error.RuntimeError(
-                expr.paren, "can only call functions and classes."
+                expr.paren,
+                f"Expected {temp_function.arity()} arguments "
+                f"but got {len(expr.arguments)}.",
             )
 
-        return temp_function.call(self, arguments)
+        if self.budget is not None:
+            self.call_line = expr.paren.line
+        return temp_function, arguments
 
     def visit_get_expr(self, expr: expr.Get) -> Any:
         object = self.evaluate(expr.object)
         if isinstance(object, LoxInstance):
-            return object.get(expr.name)
+            return object.get(expr.name, expr)
 
         raise runtime_error.RuntimeError(expr.name, "Only instances have properties.")
 
@@ -276,17 +375,19 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
             raise runtime_error.RuntimeError(expr.name, "Only instances have fields.")
 
         value = self.evaluate(expr.value)
-        object.set(expr.name, value)
+        object.set(expr.name, value, expr)
+        return value
 
     def visit_super_expr(self, expr: expr.Super) -> Any:
-        distance = self.locals.get(expr)
-        superclass = self.environment.get_at(
-            distance, ts.Token(ts.TokenType.SUPER, "super", "DUMMY", -1)
-        )
+        object, method = self.find_super_method(expr)
+        return method.bind(object)
 
-        object = self.environment.get_at(
-            distance - 1, ts.Token(ts.TokenType.THIS, "this", "DUMMY", -1)
-        )
+    def find_super_method(self, expr: expr.Super) -> Tuple[LoxInstance, LoxFunction]:
+        superclass = self.environment.get_at(expr.depth, expr.slot)
+
+        # The method's frame sits just inside the "super" scope, with "this"
+        # in its first slot.
+        object = self.environment.get_at(expr.depth - 1, 0)
         method = superclass.find_method(expr.method.lexeme)
 
         if method is None:
@@ -294,7 +395,7 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
                 expr.method, "Undefined property '" + expr.method.lexeme + "'."
             )
 
-        return method.bind(object)
+        return object, method
 
     def visit_this_expr(self, expr: expr.This) -> Any:
         return self.look_up_variable(expr.keyword, expr)
@@ -305,10 +406,14 @@ class Interpreter(expr.Visitor, stmt.StmtVisitor):
         if expr.operator.type == ts.TokenType.BANG:
             return self.stringify(not self.is_truthy(right))
         elif expr.operator.type == ts.TokenType.MINUS:
-            return -right
+            return self.negate(expr.operator, right)
         else:
             return None
 
+    def negate(self, operator: ts.Token, operand: Any) -> Any:
+        self.check_number_operand(operator, operand)
+        return -operand
+
     def check_number_operand(self, operator: ts.Token, operand):
         if isinstance(operand, int) or isinstance(operand, float):
             return
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 from lox_callable import LoxCallable
 from typing import List, Any, Dict
-from lox_instance import LoxInstance
+from lox_instance import LoxInstance, Shape
 
 if TYPE_CHECKING:
     import interpreter
@@ -15,27 +15,30 @@ class LoxClass(LoxCallable):
         self.superclass = superclass
         self.methods = methods
 
-    def find_method(self, name: str):
-        if name in self.methods:
-            return self.methods[name]
-
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
+        # Inherited methods are merged in once, when the class is defined, so
+        # a lookup never has to walk the superclass chain.
+        if superclass is not None:
+            self.method_table = {**superclass.method_table, **methods}
+        else:
+            self.method_table = dict(methods)
+        self.initializer = self.method_table.get("init")
+        # Instances start out with no fields; their shapes grow from here.
+        self.root_shape = Shape()
 
-        return None
+    def find_method(self, name: str):
+        return self.method_table.get(name)
 
     def __repr__(self) -> str:
         return self.name
 
     def call(self, interpreter: interpreter.Interpreter, arguments: List[Any]):
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
-        if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+        interpreter.counters.instances += 1
+        if self.initializer is not None:
+            self.initializer.bind(instance).call(interpreter, arguments)
         return instance
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        if initializer is None:
+        if self.initializer is None:
             return 0
-        return initializer.arity()
+        return self.initializer.arity()
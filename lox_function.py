@@ -3,9 +3,8 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 from environment import Environment
 from lox_callable import LoxCallable
-import return_exception_type
+from return_exception_type import TailCall
 from typing import Any, List
-import tokens as ts
 
 if TYPE_CHECKING:
     import stmt
@@ -20,32 +19,72 @@ class LoxFunction(LoxCallable):
         self.closure = closure
         self.is_initializer = is_initializer
 
-    def bind(self, instance: LoxInstance):
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.is_initializer)
+    def bind(self, instance: LoxInstance) -> LoxBoundMethod:
+        return LoxBoundMethod(instance, self)
 
     def call(self, interpreter, arguments: List[Any]):
-        environment = Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, arguments[i])
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except return_exception_type.Return as r:
-            if self.is_initializer:
-                return self.closure.get_at(
-                    0, ts.Token(ts.TokenType.THIS, "this", "DUMMY", -1)
-                )
-            return r.value
-
-        if self.is_initializer:
-            return self.closure.get_at(
-                0, ts.Token(ts.TokenType.THIS, "this", "DUMMY", -1)
+        function = self
+        while True:
+            # Parameters occupy the first slots of the frame, in order, so the
+            # (freshly built) argument list becomes the frame's value list.
+            # A method's receiver comes first, in the slot for "this".
+            environment = Environment(function.closure, arguments)
+            counters = interpreter.counters
+            counters.calls += 1
+            counters.environments += 1
+            if interpreter.budget is not None:
+                interpreter.budget.tick(interpreter.call_line)
+            completion = interpreter.execute_block(
+                function.declaration.body, environment
             )
-        return None
+
+            if function.is_initializer:
+                return environment.values[0]
+            if completion is None:
+                return None
+            if type(completion) is not TailCall:
+                return completion.value
+
+            # Run a tail call to another Lox function in this loop rather
+            # than a nested call, so tail recursion uses constant stack.
+            callee = completion.callee
+            arguments = completion.arguments
+            if type(callee) is LoxBoundMethod:
+                arguments = [callee.receiver, *arguments]
+                callee = callee.method
+            if type(callee) is not LoxFunction:
+                return callee.call(interpreter, arguments)
+            function = callee
 
     def arity(self) -> int:
         return len(self.declaration.params)
 
+    def __repr__(self) -> str:
+        return self.to_string()
+
+    def to_string(self) -> str:
+        return f"<fn {self.declaration.name.lexeme}>"
+
+
+class LoxBoundMethod(LoxCallable):
+    """A method taken off an instance as a value. Calls made straight on a
+    property go to the method itself, so these are only built when the
+    method is stored or passed around first."""
+
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: LoxInstance, method: LoxCallable):
+        self.receiver = receiver
+        self.method = method
+
+    def call(self, interpreter, arguments: List[Any]):
+        return self.method.call(interpreter, [self.receiver, *arguments])
+
+    def arity(self) -> int:
+        return self.method.arity()
+
+    def __repr__(self) -> str:
+        return self.to_string()
+
     def to_string(self) -> str:
-        return "<fn {self.declaration.name.lexeme}>"
+        return self.method.to_string()
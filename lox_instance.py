@@ -1,31 +1,150 @@
 from __future__ import annotations
 import runtime_error
 import tokens as ts
-from typing import Any, TYPE_CHECKING
+from typing import Any, Dict, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
+    import expr
     import lox_class
 
+# Past any of these limits an instance stops sharing shapes and keeps its
+# fields in a dict of its own: it has too many fields, objects built from the
+# same shape disagree too much about which field comes next, or its class has
+# grown too many shapes altogether. The last keeps instances used as
+# dictionaries, with keys added in many orders, from growing the class's
+# shape tree without bound; since every shape copies its parent's slots,
+# together the limits also bound the memory the tree can hold.
+MAX_SHAPE_FIELDS = 64
+MAX_SHAPE_TRANSITIONS = 16
+MAX_CLASS_SHAPES = 256
+
+
+class Shape:
+    """The layout shared by instances that gained the same fields in the same
+    order: where each field lives in the instance's list of values, and the
+    shape an instance moves to when it gains another field."""
+
+    __slots__ = ("slots", "transitions", "root", "shape_count")
+
+    def __init__(self, slots: Dict[str, int] = None, root: Optional[Shape] = None):
+        self.slots = {} if slots is None else slots
+        self.transitions = {}
+        # The class's empty shape, which counts every shape grown from it.
+        self.root = self if root is None else root
+        self.shape_count = 1
+
+    def with_field(self, name: str) -> Optional[Shape]:
+        shape = self.transitions.get(name)
+        if shape is None:
+            root = self.root
+            if (
+                len(self.slots) >= MAX_SHAPE_FIELDS
+                or len(self.transitions) >= MAX_SHAPE_TRANSITIONS
+                or root.shape_count >= MAX_CLASS_SHAPES
+            ):
+                return None
+            root.shape_count += 1
+            shape = Shape({**self.slots, name: len(self.slots)}, root)
+            self.transitions[name] = shape
+        return shape
+
 
 class LoxInstance:
+    __slots__ = ("klass", "shape", "values", "fields")
+
     def __init__(self, klass: lox_class.LoxClass):
         self.klass = klass
-        self.fields = {}
+        self.shape = klass.root_shape
+        self.values = []
+        # Only used once the instance has left its shape, when shape is None.
+        self.fields = None
 
     def __repr__(self) -> str:
         return self.klass.name + " instance"
 
-    def get(self, name: ts.Token) -> Any:
-        if self.fields.get(name.lexeme) is not None:
-            return self.fields.get(name.lexeme)
+    def get_field(self, name: str) -> Any:
+        shape = self.shape
+        if shape is None:
+            return self.fields.get(name)
+        slot = shape.slots.get(name)
+        if slot is None:
+            return None
+        return self.values[slot]
+
+    def get(self, name: ts.Token, site: Optional[expr.Get] = None) -> Any:
+        shape = self.shape
+        cached = None if site is None else site.cached_field
+        if cached is not None and cached[0] is shape and shape is not None:
+            value = self.values[cached[1]]
+        elif shape is not None:
+            slot = shape.slots.get(name.lexeme)
+            value = None
+            if slot is not None:
+                value = self.values[slot]
+                if site is not None:
+                    site.cached_field = (shape, slot)
+        else:
+            value = self.fields.get(name.lexeme)
+
+        if value is not None:
+            return value
+        return self.get_method(name, site).bind(self)
+
+    def get_method(self, name: ts.Token, site: Optional[expr.Get] = None) -> Any:
+        """Looks up a method by name without binding it to this instance."""
+        # The Get node doing the lookup remembers the last class it saw and
+        # the method that class resolved the name to.
+        klass = self.klass
+        cached = None if site is None else site.cached_method
+        if cached is not None and cached[0] is klass:
+            method = cached[1]
+        else:
+            method = klass.find_method(name.lexeme)
+            if site is not None:
+                site.cached_method = (klass, method)
+
+        if method is None:
+            raise runtime_error.RuntimeError(
+                name, "Undefined property '" + name.lexeme + "'."
+            )
+        return method
+
+    def set(self, name: ts.Token, value: Any, site: Optional[expr.Set] = None) -> Any:
+        self.set_field(name.lexeme, value, site)
+
+    def set_field(self, name: str, value: Any, site: Optional[expr.Set] = None) -> None:
+        shape = self.shape
+        cached = None if site is None else site.cached_field
+        if cached is not None and cached[0] is shape and shape is not None:
+            # The Set node saw this shape before: it knows the slot, and the
+            # shape to move to if the field is new.
+            transition = cached[2]
+            if transition is None:
+                self.values[cached[1]] = value
+            else:
+                self.values.append(value)
+                self.shape = transition
+            return
 
-        method = self.klass.find_method(name.lexeme)
-        if method is not None:
-            return method.bind(self)
+        if shape is None:
+            self.fields[name] = value
+            return
 
-        raise runtime_error.RuntimeError(
-            name, "Undefined property '" + name.lexeme + "'."
-        )
+        slot = shape.slots.get(name)
+        transition = None
+        if slot is None:
+            transition = shape.with_field(name)
+            if transition is None:
+                self.fields = {n: self.values[s] for n, s in shape.slots.items()}
+                self.fields[name] = value
+                self.shape = None
+                self.values = None
+                return
+            slot = len(self.values)
+            self.values.append(value)
+            self.shape = transition
+        else:
+            self.values[slot] = value
 
-    def set(self, name: ts.Token, value: Any) -> Any:
-        self.fields[name.lexeme] = value
+        if site is not None:
+            site.cached_field = (shape, slot, transition)
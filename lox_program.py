@@ -0,0 +1,156 @@
+from __future__ import annotations
+import copy
+from typing import Any, Callable, Dict, List, Optional
+import main_scanner
+import output_sink
+import stmt
+from interpreter import Interpreter
+from lox_string import LoxString
+from natives import NATIVES
+
+
+class Diagnostic:
+    """An error found while compiling or running a program. Kind is
+    "compile" for scanner, parser and resolver errors and "runtime" for
+    errors raised while executing."""
+
+    __slots__ = ("kind", "line", "where", "message")
+
+    def __init__(self, kind: str, line: int, where: str, message: str):
+        self.kind = kind
+        self.line = line
+        self.where = where
+        self.message = message
+
+    def __str__(self) -> str:
+        if self.kind == "runtime":
+            return f"[line {self.line}] {self.message}"
+        return f"[line {self.line}] Error{self.where}: {self.message}"
+
+    def __repr__(self) -> str:
+        return f"Diagnostic({self.kind!r}, {self.line}, {self.message!r})"
+
+
+class CompileError(Exception):
+    def __init__(self, diagnostics: List[Diagnostic]):
+        super().__init__("\n".join(str(d) for d in diagnostics))
+        self.diagnostics = diagnostics
+
+
+class RunResult:
+    def __init__(
+        self,
+        output: output_sink.OutputSink,
+        diagnostics: List[Diagnostic],
+        globals: Dict[str, Any],
+    ):
+        # The sink print statements wrote to: a MemorySink unless the caller
+        # passed their own.
+        self.output = output
+        self.diagnostics = diagnostics
+        # Every global variable as the program left it, converted by from_lox,
+        # leaving out the natives the program did not redefine.
+        self.globals = globals
+
+    @property
+    def ok(self) -> bool:
+        return not self.diagnostics
+
+
+class LoxProgram:
+    """A program scanned, parsed and resolved once by compile, which can
+    then be run any number of times. Each run gets an interpreter of its
+    own, so runs do not see each other's globals. The vm and python engines
+    compile the program on its first run with them and reuse that code on
+    later runs."""
+
+    def __init__(
+        self,
+        source: str,
+        statements: Optional[List[stmt.Stmt]],
+        diagnostics: List[Diagnostic],
+    ):
+        self.source = source
+        self.statements = statements
+        self.diagnostics = diagnostics
+        # Bytecode and Python code compiled from the statements, for
+        # RunOptions.code_cache.
+        self.code_cache = {}
+
+    @property
+    def ok(self) -> bool:
+        return self.statements is not None
+
+    def run(
+        self,
+        globals: Optional[Dict[str, Any]] = None,
+        output: Optional[output_sink.OutputSink] = None,
+        engine: str = "tree",
+        options: Optional[main_scanner.RunOptions] = None,
+    ) -> RunResult:
+        """Runs the program with the given values, Python or Lox, defined
+        as globals first. Runtime errors end the run and are returned in
+        the result; running a program that failed to compile raises
+        CompileError.
+
+        A Python exception escaping the engine, which means the interpreter
+        failed to check something, also ends the run with a runtime
+        diagnostic, at line 0 since the line is not known, so one bad
+        script cannot bring down a host running many."""
+        if not self.ok:
+            raise CompileError(self.diagnostics)
+
+        options = main_scanner.RunOptions() if options is None else copy.copy(options)
+        if output is not None:
+            options.output = output
+        elif options.output is None:
+            options.output = output_sink.MemorySink()
+        options.code_cache = self.code_cache
+
+        interpreter = Interpreter(options.output)
+        for name, value in (globals or {}).items():
+            interpreter.globals.define(name, to_lox(value))
+
+        diagnostics = []
+        with main_scanner.capture_diagnostics(collector(diagnostics)):
+            try:
+                main_scanner.execute(self.statements, interpreter, engine, options)
+            except Exception as e:
+                message = f"Internal error: {type(e).__name__}: {e}"
+                diagnostics.append(Diagnostic("runtime", 0, "", message))
+        values = {
+            name: from_lox(value)
+            for name, value in interpreter.globals.values.items()
+            if NATIVES.get(name) is not value
+        }
+        return RunResult(options.output, diagnostics, values)
+
+
+def compile(source: str, scanner_engine: str = "regex") -> LoxProgram:
+    """Compiles Lox source for running with LoxProgram.run. Errors are
+    collected on the returned program rather than written to stderr."""
+    diagnostics = []
+    with main_scanner.capture_diagnostics(collector(diagnostics)):
+        statements = main_scanner.parse_program(source, scanner_engine)
+    return LoxProgram(source, statements, diagnostics)
+
+
+def collector(diagnostics: List[Diagnostic]) -> Callable[[str, int, str, str], None]:
+    def collect(kind: str, line: int, where: str, message: str) -> None:
+        diagnostics.append(Diagnostic(kind, line, where, message))
+
+    return collect
+
+
+def to_lox(value: Any) -> Any:
+    # Lox numbers are floats; a Python int would print and compare wrongly.
+    if type(value) is int:
+        return float(value)
+    return value
+
+
+def from_lox(value: Any) -> Any:
+    # Long strings built by concatenation are ropes; hand back the text.
+    if type(value) is LoxString:
+        return str(value)
+    return value
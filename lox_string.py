@@ -0,0 +1,76 @@
+from __future__ import annotations
+from typing import Any, List, Union
+
+# Concatenations shorter than this are done eagerly on Python strings: a rope
+# only pays for itself once copying the text costs more than building one.
+MIN_ROPE_LENGTH = 256
+
+
+class LoxString:
+    """A Lox string produced by concatenation, kept as a list of pieces and
+    only joined into a Python str the first time its text is observed.
+
+    Every string in a chain like `s = s + piece` shares one pieces list and
+    knows how many leading pieces belong to it, so appending to the newest
+    string in the chain is O(1) and building a long string piecewise stays
+    linear instead of quadratic.
+    """
+
+    __slots__ = ("pieces", "count", "length", "flat")
+
+    def __init__(self, pieces: List[str], count: int, length: int):
+        self.pieces = pieces
+        self.count = count
+        self.length = length
+        self.flat = None
+
+    def __str__(self) -> str:
+        if self.flat is None:
+            pieces = self.pieces
+            if self.count == len(pieces):
+                self.flat = "".join(pieces)
+            else:
+                self.flat = "".join(pieces[: self.count])
+        return self.flat
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, LoxString):
+            return self.length == other.length and str(self) == str(other)
+        return str(self) == other
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+
+STRING_TYPES = (str, LoxString)
+
+
+def concat(left: Union[str, LoxString], right: Union[str, LoxString]) -> Any:
+    """Concatenates two Lox strings, either of which may be a rope."""
+    length = len(left) + len(right)
+    if length < MIN_ROPE_LENGTH:
+        return str(left) + str(right)
+
+    if type(right) is LoxString:
+        right = str(right)
+
+    if type(left) is LoxString:
+        pieces = left.pieces
+        if left.count == len(pieces):
+            # Nothing has been appended after left yet: extend its list.
+            pieces.append(right)
+            return LoxString(pieces, left.count + 1, length)
+        if left.flat is None:
+            return LoxString([*pieces[: left.count], right], left.count + 1, length)
+        left = left.flat
+
+    return LoxString([left, right], 2, length)
@@ -1,74 +1,550 @@
+from __future__ import annotations
 import sys
+import argparse
+import contextlib
+import contextvars
+import mmap
+import os
 import scanner
+import regex_scanner
+import stream_scanner
+import token_buffer
+import script_cache
+import closure_compiler
+import budget
+import bytecode
+import bytecode_compiler
+import vm
+import python_transpiler
+import output_sink
 import tokens as ts
 from parser import Parser
 import side_code_gen.ast_printer as ast_printer
 import resolver
+import run_stats
 import runtime_error
+import stmt
 from interpreter import Interpreter
+import profiler
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-had_error = False
-had_runtime_error = False
+SCANNERS = ("classic", "regex", "compact")
+ENGINES = ("tree", "closure", "vm", "python")
+
+# Returned by the statement iterator in execute_stream once it is exhausted.
+END_OF_STREAM = object()
+
+
+class ErrorState:
+    """Whether the program being compiled or run has reported an error, and
+    where errors go. Each thread, and each block run under
+    capture_diagnostics, has its own; see errors()."""
+
+    __slots__ = ("had_error", "had_runtime_error", "output", "handler")
+
+    def __init__(
+        self, handler: Optional[Callable[[str, int, str, str], None]] = None
+    ):
+        self.had_error = False
+        self.had_runtime_error = False
+        # Sink of the program being run, flushed before any diagnostic is
+        # written so stdout and stderr stay in order.
+        self.output: Optional[output_sink.OutputSink] = None
+        # While set, receives every error as (kind, line, where, message)
+        # instead of stderr, kind being "compile" or "runtime".
+        self.handler = handler
+
+    def clear(self) -> None:
+        self.had_error = False
+        self.had_runtime_error = False
+
+
+error_state: contextvars.ContextVar[ErrorState] = contextvars.ContextVar(
+    "error_state"
+)
+
+
+def errors() -> ErrorState:
+    """The error state of the current context, created on first use."""
+    state = error_state.get(None)
+    if state is None:
+        state = ErrorState()
+        error_state.set(state)
+    return state
+
+
+class RunOptions:
+    """Settings that tune how a program executes rather than what it means."""
+
+    def __init__(
+        self,
+        max_call_depth: Optional[int] = None,
+        tail_calls: bool = True,
+        output: Optional[output_sink.OutputSink] = None,
+        profiler: Optional[profiler.Profiler] = None,
+        stats: Optional[run_stats.RunStats] = None,
+        budget: Optional[budget.Budget] = None,
+        code_cache: Optional[Dict[Any, Any]] = None,
+    ):
+        self.max_call_depth = max_call_depth
+        self.tail_calls = tail_calls
+        self.output = output
+        # Only the tree engine can be profiled.
+        self.profiler = profiler
+        self.stats = stats
+        self.budget = budget
+        # Code the vm and python engines compiled on earlier runs of the same
+        # statements, which they reuse and add to. Only for running one
+        # statement list over and over, as LoxProgram does.
+        self.code_cache = code_cache
 
 
 def main():
-    if len(sys.argv) > 2:
-        print("Usage: plox [script]")
-    elif len(sys.argv) == 2:
-        run_file(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(prog="plox")
+    arg_parser.add_argument("script", nargs="?")
+    arg_parser.add_argument(
+        "--scanner",
+        choices=SCANNERS,
+        default="regex",
+        help="scanning engine used to tokenize the source",
+    )
+    arg_parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="tree",
+        help="execution engine: tree-walker, closures, bytecode VM or Python source",
+    )
+    arg_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="scan, parse and execute the script one top-level statement at a time",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="do not read or write the compiled script cache in __loxcache__",
+    )
+    arg_parser.add_argument(
+        "--disassemble",
+        action="store_true",
+        help="print the script's bytecode instead of running it",
+    )
+    arg_parser.add_argument(
+        "--emit-python",
+        metavar="FILE",
+        help="write the script transpiled to a Python module instead of running it",
+    )
+    arg_parser.add_argument(
+        "--max-call-depth",
+        type=int,
+        default=vm.DEFAULT_MAX_FRAMES,
+        metavar="N",
+        help="deepest Lox call stack the vm engine allows before a stack overflow",
+    )
+    arg_parser.add_argument(
+        "--no-tail-calls",
+        dest="tail_calls",
+        action="store_false",
+        help="give every call in tail position its own frame, as a debugging aid",
+    )
+    arg_parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="write the output of print statements to FILE instead of stdout",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="profile the script on the tree engine, report on stderr and "
+        "save the results as JSON in FILE",
+    )
+    arg_parser.add_argument(
+        "--sample",
+        metavar="FILE",
+        help="sample the Lox call stack while the script runs on the tree engine "
+        "and write collapsed stacks for a flame graph to FILE",
+    )
+    arg_parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=profiler.DEFAULT_SAMPLE_RATE,
+        metavar="HZ",
+        help="samples per second taken by --sample",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="report time, peak memory and work done in each phase on stderr",
+    )
+    arg_parser.add_argument(
+        "--stats-json",
+        metavar="FILE",
+        help="write the statistics --stats reports to FILE as JSON",
+    )
+    arg_parser.add_argument(
+        "--max-steps",
+        type=int,
+        metavar="N",
+        help="stop the script with a runtime error after N loop iterations and "
+        "function calls",
+    )
+    arg_parser.add_argument(
+        "--max-seconds",
+        type=float,
+        metavar="S",
+        help="stop the script with a runtime error after S seconds",
+    )
+    arg_parser.add_argument(
+        "--max-heap",
+        type=int,
+        metavar="BYTES",
+        help="stop the script with a runtime error once it has allocated more "
+        "than BYTES of live memory",
+    )
+    args = arg_parser.parse_args()
+    if args.profile is not None and args.engine != "tree":
+        arg_parser.error("--profile needs --engine tree")
+    if args.sample is not None and args.engine != "tree":
+        arg_parser.error("--sample needs --engine tree")
+    if args.sample is not None and args.profile is not None:
+        arg_parser.error("--sample and --profile cannot be combined")
+    options = RunOptions(
+        max_call_depth=args.max_call_depth,
+        tail_calls=args.tail_calls,
+        output=output_sink.FileSink(args.output) if args.output else None,
+        profiler=profiler.Profiler() if args.profile else None,
+        stats=run_stats.RunStats() if args.stats or args.stats_json else None,
+    )
+    if (
+        args.max_steps is not None
+        or args.max_seconds is not None
+        or args.max_heap is not None
+    ):
+        options.budget = budget.Budget(args.max_steps, args.max_seconds, args.max_heap)
+
+    sampler = None
+    if args.sample is not None:
+        sampler = profiler.SamplingProfiler(args.sample_rate)
+        sampler.start()
+    try:
+        run_command(args, options)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+            sampler.write_collapsed(args.sample)
+        if options.profiler is not None:
+            options.profiler.report(sys.stderr)
+            options.profiler.write_json(args.profile)
+        if options.stats is not None:
+            if args.stats:
+                options.stats.report(sys.stderr)
+            if args.stats_json:
+                options.stats.write_json(args.stats_json)
+
+
+def run_command(args: argparse.Namespace, options: RunOptions):
+    if args.script is not None and args.disassemble:
+        disassemble_file(
+            args.script, scanner_engine=args.scanner, tail_calls=args.tail_calls
+        )
+    elif args.script is not None and args.emit_python is not None:
+        transpile_file(args.script, args.emit_python, scanner_engine=args.scanner)
+    elif args.script is not None and args.stream:
+        run_stream(args.script, engine=args.engine, options=options)
+    elif args.script is not None:
+        run_file(
+            args.script,
+            scanner_engine=args.scanner,
+            use_cache=args.use_cache,
+            engine=args.engine,
+            options=options,
+        )
     else:
-        run_prompt()
+        run_prompt(scanner_engine=args.scanner, engine=args.engine, options=options)
 
 
-def run_file(path: str):
+def run_file(
+    path: str,
+    scanner_engine: str = "regex",
+    use_cache: bool = True,
+    engine="tree",
+    options: Optional[RunOptions] = None,
+):
     lines = None
     with open(path) as f:
         lines = f.read()
 
-    run(lines)
-    if had_error:
+    run(lines, scanner_engine, path if use_cache else None, engine, options)
+    if errors().had_error:
         sys.exit("Error was detected")
-    if had_runtime_error:
+    if errors().had_runtime_error:
         sys.exit("Runtime error was detected")
 
 
-def run_prompt():
+def disassemble_file(
+    path: str, scanner_engine: str = "regex", tail_calls: bool = True
+):
+    with open(path, "r") as f:
+        lines = f.read()
+
+    statements = parse_program(lines, scanner_engine)
+    if statements is None:
+        sys.exit("Error was detected")
+
+    compiler = bytecode_compiler.BytecodeCompiler(tail_calls=tail_calls)
+    function = compiler.compile(statements)
+    print(bytecode.disassemble(function))
+
+
+def transpile_file(path: str, output: str, scanner_engine: str = "regex"):
+    with open(path, "r") as f:
+        lines = f.read()
+
+    statements = parse_program(lines, scanner_engine)
+    if statements is None:
+        sys.exit("Error was detected")
+
+    module = python_transpiler.PythonTranspiler(path).transpile(statements)
+    with open(output, "w") as f:
+        f.write(module.source)
+
+
+def run_stream(
+    path: str, engine: str = "tree", options: Optional[RunOptions] = None
+):
+    with open(path, "rb") as f:
+        source = f
+        if os.fstat(f.fileno()).st_size > 0:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            execute_stream(stream_scanner.StreamScanner(source), engine, options)
+        finally:
+            if source is not f:
+                source.close()
+
+    if errors().had_error:
+        sys.exit("Error was detected")
+    if errors().had_runtime_error:
+        sys.exit("Runtime error was detected")
+
+
+def execute_stream(
+    scanner_instance: stream_scanner.StreamScanner,
+    engine="tree",
+    options: Optional[RunOptions] = None,
+):
+    stats = None if options is None else options.stats
+    parser = Parser(scanner_instance.iter_tokens())
+    interpreter = Interpreter()
+    engine_instance = make_engine(interpreter, engine, options)
+    temp_resolver = resolver.Resolver()
+    statements = parser.iter_parse()
+    state = errors()
+
+    if interpreter.budget is not None:
+        interpreter.budget.start()
+    try:
+        while True:
+            # Tokens are scanned as the parser asks for them, so scanning is
+            # counted as part of parsing here.
+            with run_stats.phase(stats, "parse"):
+                statement = next(statements, END_OF_STREAM)
+            if statement is END_OF_STREAM or state.had_error:
+                return
+            if stats is not None:
+                stats.count("parse", "nodes", run_stats.count_nodes([statement]))
+
+            with run_stats.phase(stats, "resolve"):
+                temp_resolver.resolve([statement])
+            if state.had_error:
+                return
+
+            with run_stats.phase(stats, "execute"):
+                engine_instance.interpret([statement])
+            if state.had_runtime_error:
+                return
+    finally:
+        interpreter.output.flush()
+        if interpreter.budget is not None:
+            interpreter.budget.finish()
+        if stats is not None:
+            stats.count_execution(interpreter.counters)
+
+
+def run_prompt(
+    scanner_engine: str = "regex",
+    engine: str = "tree",
+    options: Optional[RunOptions] = None,
+):
     while True:
         data = input("> ")
         if data is None:
             break
-        run(data)
-        hadError = False
+        run(data, scanner_engine, engine=engine, options=options)
+        errors().clear()
 
 
-def run(lines: str):
-    scanner_instance = scanner.Scanner(lines)
-    tokens = scanner_instance.scanTokens()
+def run(
+    lines: str,
+    scanner_engine: str = "regex",
+    cache_for: Optional[str] = None,
+    engine: str = "tree",
+    options: Optional[RunOptions] = None,
+):
+    stats = None if options is None else options.stats
+    program = load_program(lines, scanner_engine, cache_for, stats)
+    if program is None:
+        return
 
-    parser = Parser(tokens)
+    statements, interpreter = program
+    execute(statements, interpreter, engine, options)
 
-    statements = parser.parse()
-    interpreter = Interpreter()
 
-    if had_error:
-        return
+def execute(
+    statements: List[stmt.Stmt],
+    interpreter: Interpreter,
+    engine: str = "tree",
+    options: Optional[RunOptions] = None,
+):
+    """Runs resolved statements on an interpreter with the given engine."""
+    stats = None if options is None else options.stats
+    try:
+        with run_stats.phase(stats, "execute"):
+            engine_instance = make_engine(interpreter, engine, options)
+            if interpreter.budget is not None:
+                interpreter.budget.start()
+            engine_instance.interpret(statements)
+    finally:
+        interpreter.output.flush()
+        if interpreter.budget is not None:
+            interpreter.budget.finish()
+        if stats is not None:
+            stats.count_execution(interpreter.counters)
 
-    temp_resolver = resolver.Resolver(interpreter)
-    temp_resolver.resolve(statements)
 
-    if had_error:
-        return
+def make_engine(
+    interpreter: Interpreter, engine: str, options: Optional[RunOptions] = None
+):
+    if options is None:
+        options = RunOptions()
+    interpreter.tail_calls = options.tail_calls
+    interpreter.budget = options.budget
+    if options.output is not None:
+        interpreter.output = options.output
+    errors().output = interpreter.output
+
+    if options.profiler is not None:
+        if engine != "tree":
+            raise ValueError("only the tree engine can be profiled")
+        profiled = profiler.ProfilingInterpreter(options.profiler, interpreter.output)
+        # Runs in the same state as the interpreter it stands in for.
+        profiled.globals = profiled.environment = interpreter.globals
+        profiled.tail_calls = interpreter.tail_calls
+        profiled.budget = interpreter.budget
+        profiled.counters = interpreter.counters
+        return profiled
+    if engine == "closure":
+        return closure_compiler.ClosureEngine(interpreter)
+    if engine == "vm":
+        return vm.VM(interpreter, options.max_call_depth, options.code_cache)
+    if engine == "python":
+        return python_transpiler.PythonEngine(interpreter, options.code_cache)
+    return interpreter
+
+
+def load_program(
+    lines: str,
+    scanner_engine: str = "regex",
+    cache_for: Optional[str] = None,
+    stats: Optional[run_stats.RunStats] = None,
+) -> Optional[Tuple[List[stmt.Stmt], Interpreter]]:
+    statements = parse_program(lines, scanner_engine, cache_for, stats)
+    if statements is None:
+        return None
+    return statements, Interpreter()
+
 
-    interpreter.interpret(statements)
+def parse_program(
+    lines: str,
+    scanner_engine: str = "regex",
+    cache_for: Optional[str] = None,
+    stats: Optional[run_stats.RunStats] = None,
+) -> Optional[List[stmt.Stmt]]:
+    """Scans, parses and resolves a program, or returns None once an error
+    has been reported."""
+    if cache_for is not None:
+        with run_stats.phase(stats, "cache"):
+            statements = script_cache.load(cache_for, lines, scanner_engine)
+        if statements is not None:
+            return statements
+
+    with run_stats.phase(stats, "scan"):
+        scanner_instance = make_scanner(lines, scanner_engine)
+        tokens = scanner_instance.scanTokens()
+
+    with run_stats.phase(stats, "parse"):
+        parser = Parser(tokens)
+        statements = parser.parse()
+    if stats is not None:
+        stats.count("scan", "tokens", len(tokens))
+        stats.count("parse", "nodes", run_stats.count_nodes(statements))
+
+    if errors().had_error:
+        return None
+
+    with run_stats.phase(stats, "resolve"):
+        temp_resolver = resolver.Resolver()
+        temp_resolver.resolve(statements)
+
+    if errors().had_error:
+        return None
+
+    if cache_for is not None:
+        script_cache.store(cache_for, lines, statements, scanner_engine)
+    return statements
+
+
+def make_scanner(lines: str, scanner_engine: str):
+    if scanner_engine == "classic":
+        return scanner.Scanner(lines)
+    if scanner_engine == "compact":
+        return token_buffer.CompactScanner(lines)
+    return regex_scanner.RegexScanner(lines)
 
 
 def error_with_line(line: int, message: str) -> None:
     report(line, "", message)
 
 
+def flush_output() -> None:
+    output = errors().output
+    if output is not None:
+        output.flush()
+
+
+@contextlib.contextmanager
+def capture_diagnostics(handler: Callable[[str, int, str, str], None]):
+    """Sends the errors reported inside the block to handler instead of
+    stderr. The block gets an error state of its own, so the flags start
+    out clear, and blocks running at the same time in other threads do not
+    see each other's errors."""
+    token = error_state.set(ErrorState(handler))
+    try:
+        yield
+    finally:
+        error_state.reset(token)
+
+
 def report(line: int, where: str, message: str):
+    state = errors()
+    state.had_error = True
+    if state.handler is not None:
+        state.handler("compile", line, where, message)
+        return
+    flush_output()
     sys.stderr.write(f"[line {line} ] Error{where}: {message}")
-    hadError = True
 
 
 def error(token: ts.Token, message: str):
@@ -79,9 +555,18 @@ def error(token: ts.Token, message: str):
 
 
 def lox_runtime_error(error: runtime_error.RuntimeError):
+    state = errors()
+    state.had_runtime_error = True
+    if state.handler is not None:
+        state.handler("runtime", error.token.line, "", error.message)
+        return
+    flush_output()
     sys.stderr.write(f"{error.message} \n[line {error.token.line}]")
-    had_runtime_error = True
 
 
 if __name__ == "__main__":
-    main()
+    # Run through the importable module so that errors recorded by the
+    # scanner, parser and resolver land on the same error state.
+    import main_scanner
+
+    main_scanner.main()
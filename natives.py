@@ -0,0 +1,97 @@
+from __future__ import annotations
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+from lox_callable import LoxCallable
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+
+class Counters:
+    """Running totals an interpreter keeps about the program it executes,
+    readable from Lox through the natives below.
+
+    Calls counts every Lox function or method body entered, tail calls
+    included. Environments counts heap-allocated scopes, so it stays at zero
+    on the vm and python engines, which keep locals on a stack or in Python
+    frames.
+    """
+
+    __slots__ = ("calls", "environments", "instances")
+
+    def __init__(self):
+        self.calls = 0
+        self.environments = 0
+        self.instances = 0
+
+
+class NativeFunction(LoxCallable):
+    """A Lox function implemented in Python. The Python function receives the
+    interpreter followed by the Lox arguments."""
+
+    __slots__ = ("name", "parameter_count", "function")
+
+    def __init__(self, name: str, parameter_count: int, function: Callable):
+        self.name = name
+        self.parameter_count = parameter_count
+        self.function = function
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        return self.function(interpreter, *arguments)
+
+    def arity(self) -> int:
+        return self.parameter_count
+
+    def __repr__(self) -> str:
+        return self.to_string()
+
+    def to_string(self) -> str:
+        return f"<native fn {self.name}>"
+
+
+# Every native, by the global name it is defined under in a new Interpreter.
+NATIVES: Dict[str, NativeFunction] = {}
+
+
+def native(name: str, arity: int) -> Callable[[Callable], Callable]:
+    """Registers the decorated function as a native with the given name."""
+
+    def register(function: Callable) -> Callable:
+        NATIVES[name] = NativeFunction(name, arity, function)
+        return function
+
+    return register
+
+
+@native("clock", 0)
+def clock(interpreter: Interpreter) -> float:
+    """Seconds since the epoch."""
+    return time.time()
+
+
+@native("clock_ns", 0)
+def clock_ns(interpreter: Interpreter) -> float:
+    """Nanoseconds on a monotonic clock with the best available resolution,
+    for timing sections of a program."""
+    return float(time.perf_counter_ns())
+
+
+@native("cpu_clock", 0)
+def cpu_clock(interpreter: Interpreter) -> float:
+    """Seconds of CPU time used by this process."""
+    return time.process_time()
+
+
+@native("calls_made", 0)
+def calls_made(interpreter: Interpreter) -> float:
+    return float(interpreter.counters.calls)
+
+
+@native("environments_allocated", 0)
+def environments_allocated(interpreter: Interpreter) -> float:
+    return float(interpreter.counters.environments)
+
+
+@native("instances_created", 0)
+def instances_created(interpreter: Interpreter) -> float:
+    return float(interpreter.counters.instances)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+import sys
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, TextIO
+
+# Lines a StreamSink holds before writing them out in one go.
+DEFAULT_BUFFER_LINES = 1024
+
+
+class OutputSink(ABC):
+    """Where the text of Lox print statements goes.
+
+    Engines call write_line once per print. A sink may hold lines back, so
+    whoever runs a program calls flush when it ends, before anything is
+    written to stderr, and before handing control back to a user.
+    """
+
+    @abstractmethod
+    def write_line(self, text: Optional[str]) -> None:
+        ...
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class StreamSink(OutputSink):
+    """Collects lines and writes them to a text stream in batches. With no
+    stream given it writes to whatever sys.stdout is when it flushes."""
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        buffer_lines: int = DEFAULT_BUFFER_LINES,
+    ):
+        self.stream = stream
+        self.buffer_lines = buffer_lines
+        self.pending = []
+
+    def write_line(self, text: Optional[str]) -> None:
+        pending = self.pending
+        pending.append(f"{text}\n")
+        if len(pending) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self) -> None:
+        stream = sys.stdout if self.stream is None else self.stream
+        if self.pending:
+            stream.write("".join(self.pending))
+            self.pending.clear()
+        stream.flush()
+
+
+class FileSink(StreamSink):
+    def __init__(self, path: str, buffer_lines: int = DEFAULT_BUFFER_LINES):
+        super().__init__(open(path, "w"), buffer_lines)
+
+    def close(self) -> None:
+        self.flush()
+        self.stream.close()
+
+
+class MemorySink(OutputSink):
+    """Keeps every printed line, for programs run from Python code."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write_line(self, text: Optional[str]) -> None:
+        self.lines.append(f"{text}")
+
+    def getvalue(self) -> str:
+        return "".join(f"{line}\n" for line in self.lines)
+
+
+class CallbackSink(OutputSink):
+    """Hands each printed line, without its newline, to a function."""
+
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
+
+    def write_line(self, text: Optional[str]) -> None:
+        self.callback(f"{text}")
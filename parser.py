@@ -1,39 +1,81 @@
 from telnetlib import DO
 from tokenize import Token
+from collections.abc import Sequence
 import tokens as ts
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 import expr
 import stmt
 import main_scanner
 
 
+class TokenWindow:
+    """List-like view of a token iterator for the parser.
+
+    The parser only ever indexes its current token and the one before it, so
+    tokens are pulled from the iterator on demand and the ones behind the
+    parser are dropped, keeping lookahead memory bounded.
+    """
+
+    TRIM_THRESHOLD = 256
+
+    def __init__(self, tokens: Iterator[ts.Token], history: int = 2):
+        self.tokens = tokens
+        self.window = []
+        self.offset = 0
+        self.history = history
+
+    def __getitem__(self, index: int) -> ts.Token:
+        position = index - self.offset
+        while position >= len(self.window):
+            last = self.window[-1] if self.window else None
+            self.window.append(next(self.tokens, last))
+
+        if position > self.TRIM_THRESHOLD:
+            drop = position - self.history
+            del self.window[:drop]
+            self.offset += drop
+            position -= drop
+
+        return self.window[position]
+
+
 class Parser:
     class ParseError(Exception):
         pass
 
-    def __init__(self, tokens: List[ts.Token]):
+    def __init__(self, tokens: Iterable[ts.Token]):
+        if not isinstance(tokens, Sequence):
+            tokens = TokenWindow(iter(tokens))
         self.tokens = tokens
         self.current = 0
+        # Set for a TokenBuffer: the tokens the parser consumes, and so the
+        # ones stored in the tree, are built as real Tokens, so the tree
+        # neither keeps the buffer alive nor re-slices lexemes at run time.
+        self.make_token = getattr(tokens, "token", None)
 
     def parse(self) -> List[stmt.Stmt]:
-        statements = []
+        return list(self.iter_parse())
+
+    def iter_parse(self) -> Iterator[stmt.Stmt]:
         while not self.is_at_end():
-            statements.append(self.declaration())
-        return statements
+            yield self.declaration()
 
     def declaration(self) -> Optional[stmt.Stmt]:
+        line = self.peek().line
         try:
             if self.match(ts.TokenType.CLASS):
-                return self.class_declaration()
+                declaration = self.class_declaration()
             elif self.match(ts.TokenType.FUN):
-                return self.function_declaration("function")
+                declaration = self.function_declaration("function")
             elif self.match(ts.TokenType.VAR):
-                return self.var_declaration()
+                declaration = self.var_declaration()
             else:
                 return self.statement()
         except self.ParseError as e:
             self.synchronize()
             return None
+        declaration.line = line
+        return declaration
 
     def class_declaration(self) -> stmt.Stmt:
         name = self.consume(ts.TokenType.IDENTIFIER, "Expect class name.")
@@ -83,20 +125,23 @@ class Parser:
         return stmt.Var(name, initializer)
 
     def statement(self) -> stmt.Stmt:
+        line = self.peek().line
         if self.match(ts.TokenType.FOR):
-            return self.for_statement()
-        if self.match(ts.TokenType.IF):
-            return self.if_statement()
-        if self.match(ts.TokenType.PRINT):
-            return self.print_statement()
-        if self.match(ts.TokenType.RETURN):
-            return self.return_statement()
-        if self.match(ts.TokenType.WHILE):
-            return self.while_statement()
-        if self.match(ts.TokenType.LEFT_BRACE):
-            return stmt.Block(self.block())
-
-        return self.expression_statement()
+            statement = self.for_statement()
+        elif self.match(ts.TokenType.IF):
+            statement = self.if_statement()
+        elif self.match(ts.TokenType.PRINT):
+            statement = self.print_statement()
+        elif self.match(ts.TokenType.RETURN):
+            statement = self.return_statement()
+        elif self.match(ts.TokenType.WHILE):
+            statement = self.while_statement()
+        elif self.match(ts.TokenType.LEFT_BRACE):
+            statement = stmt.Block(self.block())
+        else:
+            statement = self.expression_statement()
+        statement.line = line
+        return statement
 
     def return_statement(self) -> stmt.Stmt:
         keyword = self.previous()
@@ -108,6 +153,8 @@ class Parser:
         return stmt.Return(keyword, value)
 
     def for_statement(self) -> stmt.Stmt:
+        # The statements a for loop desugars into all report its line.
+        line = self.previous().line
         self.consume(ts.TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
 
         initializer = None
@@ -132,13 +179,18 @@ class Parser:
         body = self.statement()
 
         if increment is not None:
-            body = stmt.Block([body, stmt.Expression(increment)])
+            increment = stmt.Expression(increment)
+            increment.line = line
+            body = stmt.Block([body, increment])
+            body.line = line
 
         if condition is None:
             condition = expr.Literal(True)
         body = stmt.While(condition, body)
 
         if initializer is not None:
+            initializer.line = line
+            body.line = line
             body = stmt.Block([initializer, body])
 
         return body
@@ -254,6 +306,8 @@ class Parser:
         return self.tokens[self.current]
 
     def previous(self) -> ts.Token:
+        if self.make_token is not None:
+            return self.make_token(self.current - 1)
         return self.tokens[self.current - 1]
 
     def comparison(self) -> expr.Expr:
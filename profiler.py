@@ -0,0 +1,300 @@
+from __future__ import annotations
+import collections
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+import expr
+import runtime_error
+import stmt
+from environment import Environment
+from interpreter import Interpreter
+from lox_class import LoxClass
+from lox_function import LoxFunction
+from natives import NativeFunction
+from output_sink import OutputSink
+from return_exception_type import Return
+
+# Lines listed in the text report, hottest first.
+REPORT_LINES = 20
+
+DEFAULT_SAMPLE_RATE = 100
+
+# Python frames a SamplingProfiler reads the Lox call stack from.
+LOX_CALL = LoxFunction.call.__code__
+LOX_BLOCK = Interpreter.execute_block.__code__
+LOX_SCRIPT = Interpreter.interpret.__code__
+
+
+class FunctionProfile:
+    __slots__ = ("name", "kind", "line", "calls", "inclusive", "exclusive", "active")
+
+    def __init__(self, name: str, kind: str, line: Optional[int]):
+        self.name = name
+        self.kind = kind
+        self.line = line
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        # Activations currently on the stack. Only the outermost activation
+        # of a recursive function adds to its inclusive time.
+        self.active = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "line": self.line,
+            "calls": self.calls,
+            "inclusive": self.inclusive,
+            "exclusive": self.exclusive,
+        }
+
+
+class Profiler:
+    """Call counts and times per Lox function, and statements executed per
+    source line, collected by a ProfilingInterpreter.
+
+    Inclusive time covers everything a function called; exclusive time
+    leaves out its callees. A function reached through a tail call replaces
+    its caller, so its time is counted towards whoever called the caller.
+    """
+
+    def __init__(self):
+        self.functions: Dict[Any, FunctionProfile] = {}
+        self.line_hits = collections.Counter()
+        # One [profile, start time, time spent in callees] per activation.
+        self.stack: List[list] = []
+
+    def function(
+        self, key: Any, name: str, kind: str, line: Optional[int] = None
+    ) -> FunctionProfile:
+        profile = self.functions.get(key)
+        if profile is None:
+            profile = self.functions[key] = FunctionProfile(name, kind, line)
+        return profile
+
+    def enter(self, profile: FunctionProfile) -> None:
+        profile.calls += 1
+        profile.active += 1
+        self.stack.append([profile, time.perf_counter(), 0.0])
+
+    def exit(self) -> None:
+        profile, started, callees = self.stack.pop()
+        elapsed = time.perf_counter() - started
+        profile.exclusive += elapsed - callees
+        profile.active -= 1
+        if not profile.active:
+            profile.inclusive += elapsed
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def sorted_functions(self) -> List[FunctionProfile]:
+        return sorted(
+            self.functions.values(), key=lambda p: p.exclusive, reverse=True
+        )
+
+    def total_time(self) -> float:
+        return sum(p.exclusive for p in self.functions.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_time": self.total_time(),
+            "functions": [p.to_dict() for p in self.sorted_functions()],
+            "lines": {
+                str(line): hits for line, hits in sorted(self.line_hits.items())
+            },
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self, stream: TextIO) -> None:
+        total = self.total_time()
+        calls = sum(
+            p.calls for p in self.functions.values() if p.kind != "script"
+        )
+        stream.write(f"{calls} calls in {total:.3f} seconds\n\n")
+        stream.write(
+            f"{'calls':>10} {'total s':>10} {'self s':>10} {'self %':>7}  function\n"
+        )
+        for profile in self.sorted_functions():
+            share = profile.exclusive / total if total else 0.0
+            where = "" if profile.line is None else f" (line {profile.line})"
+            stream.write(
+                f"{profile.calls:>10} {profile.inclusive:>10.4f} "
+                f"{profile.exclusive:>10.4f} {share:>7.1%}  "
+                f"{profile.name}{where}\n"
+            )
+
+        stream.write(f"\n{'line':>10} {'statements':>12}\n")
+        for line, hits in self.line_hits.most_common(REPORT_LINES):
+            stream.write(f"{line:>10} {hits:>12}\n")
+
+
+class ProfilingInterpreter(Interpreter):
+    """The tree-walking interpreter with a Profiler attached.
+
+    Profiling lives in this subclass, so an Interpreter that is not being
+    profiled runs exactly the code it always did. Lox functions and methods
+    are timed around their bodies, which also catches the calls the
+    trampoline in LoxFunction.call makes; classes and natives are timed
+    around the call.
+    """
+
+    def __init__(self, profiler: Profiler, output: Optional[OutputSink] = None):
+        super().__init__(output)
+        self.profiler = profiler
+        # Function body statement lists, by id, to the profile they count
+        # towards.
+        self.bodies: Dict[int, FunctionProfile] = {}
+        self.script = profiler.function("<script>", "<script>", "script")
+
+    def interpret(self, statements: List[stmt.Stmt]):
+        self.profiler.enter(self.script)
+        try:
+            super().interpret(statements)
+        finally:
+            self.profiler.exit()
+
+    def execute(self, statement: stmt.Stmt) -> Optional[Return]:
+        self.profiler.line_hits[statement.line] += 1
+        return statement.accept(self)
+
+    def execute_block(
+        self, statements: List[stmt.Stmt], environment: Environment
+    ) -> Optional[Return]:
+        profile = self.bodies.get(id(statements))
+        if profile is not None:
+            self.profiler.enter(profile)
+        previous = self.environment
+        try:
+            self.environment = environment
+            for statement in statements:
+                completion = self.execute(statement)
+                if completion is not None:
+                    return completion
+            return None
+        finally:
+            self.environment = previous
+            if profile is not None:
+                self.profiler.exit()
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        self.bodies[id(stmt.body)] = self.profiler.function(
+            stmt, stmt.name.lexeme, "function", stmt.name.line
+        )
+        return super().visit_function_stmt(stmt)
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        for method in stmt.methods:
+            self.bodies[id(method.body)] = self.profiler.function(
+                method,
+                f"{stmt.name.lexeme}.{method.name.lexeme}",
+                "method",
+                method.name.line,
+            )
+        return super().visit_class_stmt(stmt)
+
+    def visit_call_expr(self, expr: expr.Call) -> Any:
+        callee, arguments = self.evaluate_call(expr)
+        profile = self.call_profile(callee)
+        if profile is not None:
+            self.profiler.enter(profile)
+        try:
+            return callee.call(self, arguments)
+        except RecursionError:
+            raise runtime_error.RuntimeError(expr.paren, "Stack overflow.") from None
+        finally:
+            if profile is not None:
+                self.profiler.exit()
+
+    def call_profile(self, callee: Any) -> Optional[FunctionProfile]:
+        if isinstance(callee, NativeFunction):
+            return self.profiler.function(callee, callee.name, "native")
+        if isinstance(callee, LoxClass):
+            return self.profiler.function(callee, callee.name, "class")
+        return None
+
+
+class SamplingProfiler:
+    """Periodically samples the Lox call stack of a thread running the
+    tree-walking interpreter, for flame graphs.
+
+    A background thread reads the Lox stack straight off the interpreter's
+    Python frames: each LoxFunction.call frame is a Lox call, and the
+    statement that execute_block is running gives its line. The sampled
+    program does no extra work; the cost is the sampler holding the GIL
+    while it walks the stack.
+    """
+
+    def __init__(self, rate: float = DEFAULT_SAMPLE_RATE):
+        self.interval = 1.0 / rate
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.thread_id = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self, thread_id: Optional[int] = None) -> None:
+        """Starts sampling the given thread, by default the calling one."""
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run, name="lox-sampler", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = self.lox_stack(frame)
+            if stack:
+                self.stacks[stack] += 1
+                self.samples += 1
+
+    def lox_stack(self, frame) -> Tuple[str, ...]:
+        """The Lox calls active in a Python frame and its callers, outermost
+        first, each labelled with its function name and current line."""
+        stack = []
+        line = None
+        while frame is not None:
+            code = frame.f_code
+            if code is LOX_BLOCK or code is LOX_SCRIPT:
+                if line is None:
+                    statement = frame.f_locals.get("statement")
+                    if statement is not None:
+                        line = statement.line
+            elif code is LOX_CALL:
+                function = frame.f_locals.get("function")
+                if function is not None:
+                    name = function.declaration.name.lexeme
+                    stack.append(f"{name}:{line}")
+                line = None
+            if code is LOX_SCRIPT:
+                stack.append(f"<script>:{line}")
+                break
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def collapsed(self) -> str:
+        """The samples in the collapsed stack format flame graph tools read:
+        one line per distinct stack, frames separated by semicolons, then
+        the number of samples."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.collapsed())
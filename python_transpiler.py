@@ -0,0 +1,797 @@
+from __future__ import annotations
+import atexit
+import functools
+import re
+import sys
+import traceback
+from types import CodeType
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import expr
+import stmt
+import tokens as ts
+from expr import Get
+import closure_compiler
+import main_scanner
+import runtime_error
+from lox_callable import LoxCallable
+from lox_class import LoxClass
+from lox_instance import LoxInstance
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+# Lox globals become globals of the generated module under this prefix, so
+# they can never shadow a runtime helper or a Python builtin.
+GLOBAL_PREFIX = "g_"
+
+# Binary operators with an inline float/float fast path in generated code.
+# Everything else, and any operand that misses the fast path, goes through
+# Interpreter.binary_operation.
+FAST_OPERATORS = {
+    ts.TokenType.PLUS: "+",
+    ts.TokenType.MINUS: "-",
+    ts.TokenType.STAR: "*",
+    ts.TokenType.SLASH: "/",
+    ts.TokenType.GREATER: ">",
+    ts.TokenType.GREATER_EQUAL: ">=",
+    ts.TokenType.LESS: "<",
+    ts.TokenType.LESS_EQUAL: "<=",
+}
+
+# Generated code refers to locals through markers like "\x00R12\x00" because
+# whether local 12 is boxed is only known once every function that might
+# capture it has been generated. PythonTranspiler.render swaps them out.
+MARKER = re.compile("\x00([A-Z])([0-9]+)\x00")
+
+
+class TranspiledFunction(LoxCallable):
+    __slots__ = ("function", "name", "parameter_count")
+
+    def __init__(self, function, name: str, parameter_count: int):
+        self.function = function
+        self.name = name
+        self.parameter_count = parameter_count
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        return self.function(*arguments)
+
+    def arity(self) -> int:
+        return self.parameter_count
+
+    def __repr__(self) -> str:
+        return self.to_string()
+
+    def to_string(self) -> str:
+        return f"<fn {self.name}>"
+
+
+class TranspiledMethod(TranspiledFunction):
+    """A method as stored on its LoxClass: the Python function takes the
+    receiver as its first argument."""
+
+    __slots__ = ()
+
+    def bind(self, instance: LoxInstance) -> TranspiledFunction:
+        return TranspiledFunction(
+            functools.partial(self.function, instance),
+            self.name,
+            self.parameter_count,
+        )
+
+
+class Local:
+    def __init__(self, index: int, name: str, state: FunctionState):
+        self.index = index
+        self.name = name
+        self.state = state
+        self.captured = False
+
+
+class FunctionState:
+    def __init__(self, enclosing: Optional[FunctionState], index: int):
+        self.enclosing = enclosing
+        self.index = index
+        self.has_parameters = False
+        self.free = []
+        # The receiver local when generating an initializer's body.
+        self.initializer_this = None
+
+
+class TranspiledModule:
+    def __init__(
+        self, source: str, filename: str, global_reads: Dict, source_lines: Dict
+    ):
+        self.source = source
+        self.filename = filename
+        # (generated line, Python name) -> Lox line, for every global read.
+        self.global_reads = global_reads
+        # Generated line -> the Lox line it was generated from.
+        self.source_lines = source_lines
+
+
+class PythonTranspiler(expr.Visitor, stmt.StmtVisitor):
+    """Turns a resolved statement list into the source of a Python module.
+
+    Lox functions become nested Python functions, Lox locals become Python
+    locals and Lox globals become module globals. A local captured by an
+    inner function is kept in a one-element list, and the inner function
+    receives that box through a keyword-only default argument, so every
+    execution of a declaration inside a loop gets its own variable as in
+    Lox. Runtime helpers are supplied by runtime_namespace().
+    """
+
+    def __init__(
+        self,
+        filename: str = "<lox>",
+        constant_prefix: str = "k",
+        budgeted: bool = False,
+    ):
+        self.filename = filename
+        # Token constants are module globals looked up when an error is
+        # raised, so modules sharing a namespace need distinct names.
+        self.constant_prefix = constant_prefix
+        # Whether loops and functions call tick(line) to charge a Budget.
+        self.budgeted = budgeted
+        self.lines = []
+        self.indent = ""
+        self.constants = []
+        self.locals = []
+        self.functions = []
+        self.scopes = []
+        self.state = None
+        self.temp_count = 0
+        self.pending_reads = []
+        self.global_reads = {}
+        self.line = 0
+        self.source_lines = {}
+
+    def transpile(self, statements: List[stmt.Stmt]) -> TranspiledModule:
+        self.state = self.new_function(None)
+        for statement in statements:
+            statement.accept(self)
+
+        header = [
+            "# Generated by plox. Runs standalone when the interpreter",
+            "# sources are importable.",
+            'if __name__ == "__main__":',
+            "    import python_transpiler",
+            "    globals().update(python_transpiler.prelude())",
+            "",
+        ]
+        header.extend(self.constants)
+        header.append("")
+        offset = len(header)
+        self.global_reads = {
+            (line + offset, name): lox_line
+            for (line, name), lox_line in self.global_reads.items()
+        }
+        self.source_lines = {
+            line + offset: lox_line for line, lox_line in self.source_lines.items()
+        }
+        source = "\n".join(header + self.lines) + "\n"
+        return TranspiledModule(
+            MARKER.sub(self.render, source),
+            self.filename,
+            self.global_reads,
+            self.source_lines,
+        )
+
+    def render(self, match: re.Match) -> str:
+        kind = match.group(1)
+        index = int(match.group(2))
+        if kind == "F":
+            function = self.functions[index]
+            if not function.free:
+                return ""
+            names = ", ".join(f"{local.name}={local.name}" for local in function.free)
+            return f", *, {names}" if function.has_parameters else f"*, {names}"
+
+        local = self.locals[index]
+        name = local.name
+        if kind == "R":
+            return f"{name}[0]" if local.captured else name
+        if kind == "D":
+            return f"{name} = [" if local.captured else f"{name} = "
+        if kind == "E":
+            return "]" if local.captured else ""
+        if kind == "A":
+            return f"store({name}, " if local.captured else f"({name} := "
+        if kind == "P":
+            return f"{name} = [{name}]" if local.captured else "pass"
+        raise ValueError(f"Unknown marker {kind}.")
+
+    def emit(self, line: str) -> None:
+        lineno = len(self.lines) + 1
+        for name, lox_line in self.pending_reads:
+            self.global_reads[(lineno, name)] = lox_line
+        self.pending_reads = []
+        self.source_lines[lineno] = self.line
+        self.lines.append(self.indent + line)
+
+    def emit_suite(self, body: List[stmt.Stmt]) -> None:
+        self.indent += "    "
+        start = len(self.lines)
+        for statement in body:
+            statement.accept(self)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.indent = self.indent[:-4]
+
+    def constant(self, token: ts.Token) -> str:
+        self.line = token.line
+        name = f"{self.constant_prefix}{len(self.constants)}"
+        self.constants.append(
+            f"{name} = Token(TokenType.{token.type.name}, "
+            f"{token.lexeme!r}, None, {token.line})"
+        )
+        return name
+
+    def temp(self) -> str:
+        self.temp_count += 1
+        return f"_t{self.temp_count}"
+
+    def new_function(self, enclosing: Optional[FunctionState]) -> FunctionState:
+        state = FunctionState(enclosing, len(self.functions))
+        self.functions.append(state)
+        return state
+
+    def declare(self, name: str) -> Local:
+        local = Local(len(self.locals), f"l{len(self.locals)}_{name}", self.state)
+        self.locals.append(local)
+        self.scopes[-1][name] = local
+        return local
+
+    def ref(self, local: Local) -> str:
+        return f"\x00R{local.index}\x00"
+
+    def define(self, local: Local, value: str) -> str:
+        return f"\x00D{local.index}\x00{value}\x00E{local.index}\x00"
+
+    def resolve(self, name: str) -> Optional[Local]:
+        for scope in reversed(self.scopes):
+            local = scope.get(name)
+            if local is None:
+                continue
+            state = self.state
+            while state is not local.state:
+                local.captured = True
+                if local not in state.free:
+                    state.free.append(local)
+                state = state.enclosing
+            return local
+        return None
+
+    def read(self, name: ts.Token) -> str:
+        self.line = name.line
+        local = self.resolve(name.lexeme)
+        if local is not None:
+            return self.ref(local)
+        global_name = GLOBAL_PREFIX + name.lexeme
+        self.pending_reads.append((global_name, name.line))
+        return global_name
+
+    def function(self, declaration: stmt.Function, is_method: bool = False) -> str:
+        enclosing = self.state
+        state = self.new_function(enclosing)
+        name = f"f{state.index}_{declaration.name.lexeme}"
+        is_initializer = is_method and declaration.name.lexeme == "init"
+
+        self.state = state
+        self.scopes.append({})
+        parameters = []
+        if is_method:
+            parameters.append(self.declare("this"))
+        for param in declaration.params:
+            parameters.append(self.declare(param.lexeme))
+        state.has_parameters = bool(parameters)
+        if is_initializer:
+            state.initializer_this = parameters[0]
+
+        self.state = enclosing
+        signature = ", ".join(local.name for local in parameters)
+        # The prologue reports errors, such as a stack overflow in tick, at
+        # the declaration.
+        self.line = declaration.name.line
+        self.emit(f"def {name}({signature}\x00F{state.index}\x00):")
+        self.state = state
+
+        self.indent += "    "
+        self.emit("counters.calls += 1")
+        if self.budgeted:
+            self.emit("tick_call()")
+        for local in parameters:
+            self.emit(f"\x00P{local.index}\x00")
+        for statement in declaration.body:
+            statement.accept(self)
+        if is_initializer:
+            self.emit(f"return {self.ref(parameters[0])}")
+        self.indent = self.indent[:-4]
+
+        self.scopes.pop()
+        self.state = enclosing
+        return name
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> None:
+        self.scopes.append({})
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        local = None
+        if self.scopes:
+            local = self.declare(stmt.name.lexeme)
+            self.emit(self.define(local, "None"))
+
+        superclass = "None"
+        if stmt.superclass is not None:
+            value = stmt.superclass.accept(self)
+            self.scopes.append({})
+            super_local = self.declare("super")
+            self.emit(self.define(super_local, value))
+            superclass = self.ref(super_local)
+
+        methods = []
+        for method in stmt.methods:
+            name = self.function(method, is_method=True)
+            lexeme = method.name.lexeme
+            arity = len(method.params)
+            methods.append(f"{lexeme!r}: TranspiledMethod({name}, {lexeme!r}, {arity})")
+
+        token = self.constant(
+            stmt.superclass.name if stmt.superclass is not None else stmt.name
+        )
+        klass = (
+            f"make_class({stmt.name.lexeme!r}, {superclass}, "
+            f"{{{', '.join(methods)}}}, {token})"
+        )
+        if stmt.superclass is not None:
+            self.scopes.pop()
+
+        if local is not None:
+            self.emit(f"{self.ref(local)} = {klass}")
+        else:
+            self.emit(f"{GLOBAL_PREFIX}{stmt.name.lexeme} = {klass}")
+
+    def visit_expression_stmt(self, stmt: stmt.Expression) -> None:
+        expression = stmt.expression
+        if isinstance(expression, expr.Assign):
+            # A statement-level assignment can store directly, without the
+            # walrus or store() needed when its value is used.
+            value = expression.value.accept(self)
+            local = self.resolve(expression.name.lexeme)
+            if local is not None:
+                self.emit(f"{self.ref(local)} = {value}")
+                return
+            token = self.constant(expression.name)
+            self.emit(
+                f"assign_global({GLOBAL_PREFIX + expression.name.lexeme!r}, "
+                f"{value}, {token})"
+            )
+            return
+        self.emit(expression.accept(self))
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        local = None
+        if self.scopes:
+            # Declared first so the function can refer to itself.
+            local = self.declare(stmt.name.lexeme)
+            self.emit(self.define(local, "None"))
+
+        name = self.function(stmt)
+        function = (
+            f"TranspiledFunction({name}, {stmt.name.lexeme!r}, {len(stmt.params)})"
+        )
+        if local is not None:
+            self.emit(f"{self.ref(local)} = {function}")
+        else:
+            self.emit(f"{GLOBAL_PREFIX}{stmt.name.lexeme} = {function}")
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> None:
+        self.emit(f"write_line(stringify({stmt.expression.accept(self)}))")
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> None:
+        value = "None"
+        if stmt.initializer is not None:
+            value = stmt.initializer.accept(self)
+        if self.scopes:
+            local = self.declare(stmt.name.lexeme)
+            self.emit(self.define(local, value))
+        else:
+            self.emit(f"{GLOBAL_PREFIX}{stmt.name.lexeme} = {value}")
+
+    def visit_if_stmt(self, stmt: stmt.If) -> None:
+        self.emit(f"if {stmt.condition.accept(self)}:")
+        self.emit_suite([stmt.thenBranch])
+        if stmt.elseBranch is not None:
+            self.emit("else:")
+            self.emit_suite([stmt.elseBranch])
+
+    def visit_while_stmt(self, stmt: stmt.While) -> None:
+        self.emit(f"while {stmt.condition.accept(self)}:")
+        if not self.budgeted:
+            self.emit_suite([stmt.body])
+            return
+        # Charged at the back-edge, where the vm's LOOP charges it.
+        self.indent += "    "
+        stmt.body.accept(self)
+        self.line = stmt.line
+        self.emit(f"tick({stmt.line})")
+        self.indent = self.indent[:-4]
+
+    def visit_return_stmt(self, stmt: stmt.Return) -> None:
+        if stmt.value is not None:
+            self.emit(f"return {stmt.value.accept(self)}")
+        elif self.state.initializer_this is not None:
+            self.emit(f"return {self.ref(self.state.initializer_this)}")
+        else:
+            self.emit("return None")
+
+    def visit_assign_expr(self, expr: expr.Assign) -> str:
+        value = expr.value.accept(self)
+        local = self.resolve(expr.name.lexeme)
+        if local is not None:
+            return f"\x00A{local.index}\x00{value})"
+        token = self.constant(expr.name)
+        return (
+            f"assign_global({GLOBAL_PREFIX + expr.name.lexeme!r}, {value}, {token})"
+        )
+
+    def visit_binary_expr(self, expr: expr.Binary) -> str:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        operator = self.constant(expr.operator)
+        python_operator = FAST_OPERATORS.get(expr.operator.type)
+        if python_operator is None:
+            return f"binary({operator}, {left}, {right})"
+
+        left_constant = is_number_literal(expr.left)
+        right_constant = is_number_literal(expr.right)
+        if left_constant and right_constant:
+            return f"binary({operator}, {left}, {right})"
+        if right_constant:
+            a = self.temp()
+            return (
+                f"({a} {python_operator} {right} if type({a} := {left}) is float "
+                f"else binary({operator}, {a}, {right}))"
+            )
+        if left_constant:
+            b = self.temp()
+            return (
+                f"({left} {python_operator} {b} if type({b} := {right}) is float "
+                f"else binary({operator}, {left}, {b}))"
+            )
+        a = self.temp()
+        b = self.temp()
+        return (
+            f"({a} {python_operator} {b} if (type({a} := {left}) is float) "
+            f"& (type({b} := {right}) is float) else binary({operator}, {a}, {b}))"
+        )
+
+    def visit_call_expr(self, expr: expr.Call) -> str:
+        paren = self.constant(expr.paren)
+        count = len(expr.arguments)
+        callee = expr.callee
+
+        if isinstance(callee, Get):
+            object = callee.object.accept(self)
+            name = self.constant(callee.name)
+            arguments = [argument.accept(self) for argument in expr.arguments]
+            o = self.temp()
+            m = self.temp()
+            direct = ", ".join([o] + arguments)
+            return (
+                f"({m}.function({direct}) "
+                f"if type({m} := lookup({o} := {object}, {name})) is TranspiledMethod "
+                f"and {m}.parameter_count == {count} "
+                f"else call_method({o}, {m}, [{', '.join(arguments)}], {paren}))"
+            )
+
+        function = callee.accept(self)
+        arguments = ", ".join(argument.accept(self) for argument in expr.arguments)
+        c = self.temp()
+        return (
+            f"({c}.function({arguments}) "
+            f"if type({c} := {function}) is TranspiledFunction "
+            f"and {c}.parameter_count == {count} "
+            f"else call({c}, [{arguments}], {paren}))"
+        )
+
+    def visit_get_expr(self, expr: expr.Get) -> str:
+        return f"get({expr.object.accept(self)}, {self.constant(expr.name)})"
+
+    def visit_set_expr(self, expr: expr.Set) -> str:
+        object = expr.object.accept(self)
+        value = expr.value.accept(self)
+        return f"set_field({object}, {self.constant(expr.name)}, {value})"
+
+    def visit_grouping_expr(self, expr: expr.Grouping) -> str:
+        return f"({expr.expression.accept(self)})"
+
+    def visit_literal_expr(self, expr: expr.Literal) -> str:
+        return repr(expr.value)
+
+    def visit_logical_expr(self, expr: expr.Logical) -> str:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if expr.operator.type == ts.TokenType.OR:
+            return f"({left} or {right})"
+        return f"({left} and {right})"
+
+    def visit_super_expr(self, expr: expr.Super) -> str:
+        superclass = self.read(expr.keyword)
+        this = self.ref(self.resolve("this"))
+        return f"super_method({superclass}, {this}, {self.constant(expr.method)})"
+
+    def visit_this_expr(self, expr: expr.This) -> str:
+        return self.read(expr.keyword)
+
+    def visit_unary_expr(self, expr: expr.Unary) -> str:
+        right = expr.right.accept(self)
+        if expr.operator.type == ts.TokenType.BANG:
+            return f"stringify(not {right})"
+        if is_number_literal(expr.right):
+            return f"(-{right})"
+        operator = self.constant(expr.operator)
+        value = self.temp()
+        return (
+            f"(-{value} if type({value} := {right}) is float "
+            f"else negate({operator}, {value}))"
+        )
+
+    def visit_variable_expr(self, expr: expr.Variable) -> str:
+        return self.read(expr.name)
+
+
+def is_number_literal(expression: expr.Expr) -> bool:
+    return isinstance(expression, expr.Literal) and type(expression.value) is float
+
+
+def runtime_namespace(interpreter: Interpreter) -> Dict[str, Any]:
+    """Builds the globals a transpiled module runs in: the runtime helpers
+    its code calls, plus the interpreter's current globals."""
+    namespace = {"__name__": "__lox__"}
+
+    def call(callee: Any, arguments: List[Any], paren: ts.Token) -> Any:
+        if not isinstance(callee, LoxCallable):
+            raise runtime_error.RuntimeError(
+                paren, "can only call functions and classes."
+            )
+        if len(arguments) != callee.arity():
+            raise runtime_error.RuntimeError(
+                paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+            )
+        return callee.call(interpreter, arguments)
+
+    def call_method(
+        object: Any, method: Any, arguments: List[Any], paren: ts.Token
+    ) -> Any:
+        if type(method) is TranspiledMethod:
+            method = method.bind(object)
+        return call(method, arguments, paren)
+
+    def assign_global(name: str, value: Any, token: ts.Token) -> Any:
+        if name not in namespace:
+            raise runtime_error.RuntimeError(
+                token, "Undefined variable '" + token.lexeme + "'."
+            )
+        namespace[name] = value
+        return value
+
+    namespace.update(
+        Token=ts.Token,
+        TokenType=ts.TokenType,
+        TranspiledFunction=TranspiledFunction,
+        TranspiledMethod=TranspiledMethod,
+        binary=interpreter.binary_operation,
+        negate=interpreter.negate,
+        stringify=interpreter.stringify,
+        write_line=interpreter.output.write_line,
+        counters=interpreter.counters,
+        tick=None if interpreter.budget is None else interpreter.budget.tick,
+        call=call,
+        call_method=call_method,
+        assign_global=assign_global,
+        lookup=lookup,
+        get=get,
+        set_field=set_field,
+        store=store,
+        super_method=super_method,
+        make_class=make_class,
+    )
+    import_globals(interpreter, namespace)
+    return namespace
+
+
+def import_globals(interpreter: Interpreter, namespace: Dict[str, Any]) -> None:
+    for name, value in interpreter.globals.values.items():
+        namespace[GLOBAL_PREFIX + name] = value
+
+
+def lookup(object: Any, name: ts.Token) -> Any:
+    """Like LoxInstance.get, but leaves transpiled methods unbound so an
+    immediate call can pass the receiver directly."""
+    if not isinstance(object, LoxInstance):
+        raise runtime_error.RuntimeError(name, "Only instances have properties.")
+    value = object.get_field(name.lexeme)
+    if value is not None:
+        return value
+    method = object.klass.find_method(name.lexeme)
+    if method is None:
+        raise runtime_error.RuntimeError(
+            name, "Undefined property '" + name.lexeme + "'."
+        )
+    if type(method) is TranspiledMethod:
+        return method
+    return method.bind(object)
+
+
+def get(object: Any, name: ts.Token) -> Any:
+    if isinstance(object, LoxInstance):
+        return object.get(name)
+    raise runtime_error.RuntimeError(name, "Only instances have properties.")
+
+
+def set_field(object: Any, name: ts.Token, value: Any) -> Any:
+    if not isinstance(object, LoxInstance):
+        raise runtime_error.RuntimeError(name, "Only instances have fields.")
+    object.set(name, value)
+    return value
+
+
+def store(box: List[Any], value: Any) -> Any:
+    box[0] = value
+    return value
+
+
+def super_method(superclass: LoxClass, object: Any, method: ts.Token) -> Any:
+    function = superclass.find_method(method.lexeme)
+    if function is None:
+        raise runtime_error.RuntimeError(
+            method, "Undefined property '" + method.lexeme + "'."
+        )
+    return function.bind(object)
+
+
+def make_class(
+    name: str, superclass: Any, methods: Dict[str, Any], token: ts.Token
+) -> LoxClass:
+    if superclass is not None and not isinstance(superclass, LoxClass):
+        raise runtime_error.RuntimeError(token, "Superclass must be a class.")
+    return LoxClass(name, superclass, methods)
+
+
+def prelude() -> Dict[str, Any]:
+    """Runtime for a module written out with --emit-python and run directly
+    by CPython."""
+    from interpreter import Interpreter
+
+    interpreter = Interpreter()
+    atexit.register(interpreter.output.flush)
+    namespace = runtime_namespace(interpreter)
+    del namespace["__name__"]
+    return namespace
+
+
+class PythonEngine:
+    def __init__(
+        self, interpreter: Interpreter, code_cache: Optional[Dict[Any, Any]] = None
+    ):
+        self.interpreter = interpreter
+        self.code_cache = code_cache
+        self.namespace = runtime_namespace(interpreter)
+        self.namespace["tick_call"] = self.tick_call
+        self.modules = {}
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        module, code = self.compile(statements)
+        if code is None:
+            self.run_on_closure_engine(statements)
+            return
+
+        self.modules[module.filename] = module
+        try:
+            exec(code, self.namespace)
+        except runtime_error.RuntimeError as e:
+            main_scanner.lox_runtime_error(e)
+        except NameError as e:
+            token = self.undefined_global(e)
+            if token is None:
+                raise
+            main_scanner.lox_runtime_error(
+                runtime_error.RuntimeError(
+                    token, "Undefined variable '" + token.lexeme + "'."
+                )
+            )
+        except RecursionError as e:
+            location = self.locate(e)
+            line = location[0].source_lines.get(location[1], 0) if location else 0
+            main_scanner.lox_runtime_error(
+                runtime_error.RuntimeError(
+                    ts.Token(None, "", None, line), "Stack overflow."
+                )
+            )
+        finally:
+            self.export_globals()
+
+    def compile(
+        self, statements: List[stmt.Stmt]
+    ) -> Tuple[TranspiledModule, Optional[CodeType]]:
+        """Transpiles and compiles statements, or takes them from the code
+        cache. The code is None when CPython cannot compile it."""
+        budgeted = self.interpreter.budget is not None
+        key = ("python", budgeted)
+        cache = self.code_cache
+        if cache is not None and key in cache:
+            return cache[key]
+
+        count = len(self.modules) + 1
+        filename = f"<lox-python-{count}>"
+        module = PythonTranspiler(filename, f"k{count}_", budgeted).transpile(
+            statements
+        )
+        try:
+            code = compile(module.source, filename, "exec")
+        except (SyntaxError, MemoryError, RecursionError):
+            # CPython limits how deeply blocks and indentation nest, and
+            # deeply nested Lox can go past that; such code runs on the
+            # closure engine instead.
+            code = None
+        if cache is not None:
+            cache[key] = (module, code)
+        return module, code
+
+    def tick_call(self) -> None:
+        """Charges the budget for entering a Lox function, at the line of
+        the call, as the other engines do."""
+        self.interpreter.budget.tick_lazily(self.call_line)
+
+    def call_line(self) -> int:
+        # Above this frame are Budget.tick_lazily, tick_call and the called
+        # function's prologue, then whatever called it: maybe runtime
+        # helpers, then the generated code that made the call.
+        frame = sys._getframe(4)
+        while frame is not None:
+            module = self.modules.get(frame.f_code.co_filename)
+            if module is not None:
+                return module.source_lines.get(frame.f_lineno, 0)
+            frame = frame.f_back
+        return 0
+
+    def run_on_closure_engine(self, statements: List[stmt.Stmt]) -> None:
+        self.export_globals()
+        closure_compiler.ClosureEngine(self.interpreter).interpret(statements)
+        import_globals(self.interpreter, self.namespace)
+
+    def export_globals(self) -> None:
+        """Copies the module's Lox globals back to the interpreter's, where
+        code outside the module looks for them."""
+        values = self.interpreter.globals.values
+        start = len(GLOBAL_PREFIX)
+        for name, value in self.namespace.items():
+            if name.startswith(GLOBAL_PREFIX):
+                values[name[start:]] = value
+
+    def locate(self, error: Exception) -> Optional[Tuple[TranspiledModule, int]]:
+        """Finds the innermost generated line the error was raised from."""
+        location = None
+        for frame, lineno in traceback.walk_tb(error.__traceback__):
+            module = self.modules.get(frame.f_code.co_filename)
+            if module is not None:
+                location = (module, lineno)
+        return location
+
+    def undefined_global(self, error: NameError) -> Optional[ts.Token]:
+        """Maps CPython's NameError for an unbound module global back to the
+        Lox variable and line that read it."""
+        location = self.locate(error)
+        if location is None or not error.name.startswith(GLOBAL_PREFIX):
+            return None
+
+        module, lineno = location
+        line = module.global_reads.get((lineno, error.name))
+        if line is None:
+            return None
+        name = error.name[len(GLOBAL_PREFIX) :]
+        return ts.Token(ts.TokenType.IDENTIFIER, name, None, line)
@@ -0,0 +1,95 @@
+import re
+from tokens import KEYWORDS, Token, TokenType
+from typing import Iterable, List
+import main_scanner
+
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    [ \t\r]*
+    (?:
+    (?P<newline>\n+)
+    | (?P<comment>//[^\n]*)
+    | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<number>[0-9]+(?:\.[0-9]+)?)
+    | (?P<string>"[^"]*")
+    | (?P<unterminated>"[^"]*)
+    | (?P<operator>[!=<>]=?|[(){},.\-+;*/])
+    | (?P<error>.)
+    | (?P<space>$)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+OPERATORS = {
+    "(": TokenType.LEFT_PAREN,
+    ")": TokenType.RIGHT_PAREN,
+    "{": TokenType.LEFT_BRACE,
+    "}": TokenType.RIGHT_BRACE,
+    ",": TokenType.COMMA,
+    ".": TokenType.DOT,
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    ";": TokenType.SEMICOLON,
+    "*": TokenType.STAR,
+    "/": TokenType.SLASH,
+    "!": TokenType.BANG,
+    "!=": TokenType.BANG_EQUAL,
+    "=": TokenType.EQUAL,
+    "==": TokenType.EQUAL_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+}
+
+
+class RegexScanner:
+    """Drop-in replacement for scanner.Scanner.
+
+    Instead of stepping through the source one character at a time, every
+    step matches one whole lexeme (an identifier, a number, a string, a run
+    of whitespace or a comment) with a single compiled master pattern and
+    dispatches on the name of the group that matched.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = []
+        self.line = 1
+
+    def scanTokens(self) -> List[Token]:
+        self.scan_matches(TOKEN_PATTERN.finditer(self.source), self.tokens.append)
+        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        return self.tokens
+
+    def scan_matches(self, matches: Iterable[re.Match], append) -> None:
+        keywords = KEYWORDS
+        operators = OPERATORS
+        identifier_type = TokenType.IDENTIFIER
+        line = self.line
+
+        for match in matches:
+            kind = match.lastgroup
+            text = match.group(kind)
+            if kind == "identifier":
+                append(Token(keywords.get(text, identifier_type), text, None, line))
+            elif kind == "operator":
+                append(Token(operators[text], text, None, line))
+            elif kind == "newline":
+                line += len(text)
+            elif kind == "number":
+                append(Token(TokenType.NUMBER, text, float(text), line))
+            elif kind == "string":
+                line += text.count("\n")
+                append(Token(TokenType.STRING, text, text[1:-1], line))
+            elif kind == "space" or kind == "comment":
+                continue
+            elif kind == "unterminated":
+                line += text.count("\n")
+                main_scanner.error_with_line(line, "Unterminated string.")
+            else:
+                main_scanner.error_with_line(line, "Unexpected character.")
+
+        self.line = line
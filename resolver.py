@@ -1,7 +1,6 @@
 import enum
 import expr
 import stmt
-import interpreter
 import collections
 import main_scanner
 from typing import List
@@ -23,9 +22,9 @@ class ClassType(enum.Enum):
 
 
 class Resolver(expr.Visitor, stmt.StmtVisitor):
-    def __init__(self, interpreter: interpreter.Interpreter):
-        self.interpreter = interpreter
+    def __init__(self):
         self.scopes = collections.deque()
+        self.slots = collections.deque()
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
 
@@ -57,9 +56,7 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
         if stmt.superclass is not None:
             self.begin_scope()
             self.scopes[-1]["super"] = True
-
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
+            self.add_slot("super")
 
         for method in stmt.methods:
             declaration = FunctionType.METHOD
@@ -68,8 +65,6 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
 
             self.resolve_function(method, declaration)
 
-        self.end_scope()
-
         if stmt.superclass is not None:
             self.end_scope()
 
@@ -100,6 +95,7 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
                     stmt.keyword, "Can't return a value from an initializer."
                 )
             self.resolve_expr(stmt.value)
+            stmt.tail_call = isinstance(stmt.value, expr.Call)
         return None
 
     def visit_while_stmt(self, stmt: stmt.While):
@@ -203,6 +199,11 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
         self.current_function = type
 
         self.begin_scope()
+        if type is FunctionType.METHOD or type is FunctionType.INITIALIZER:
+            # The receiver is passed in the method's own frame, ahead of the
+            # parameters, rather than in a scope of its own.
+            self.scopes[-1]["this"] = True
+            self.add_slot("this")
         for param in func.params:
             self.declare(param)
             self.define(param)
@@ -213,9 +214,16 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
 
     def begin_scope(self) -> None:
         self.scopes.append({})
+        self.slots.append({})
 
     def end_scope(self) -> None:
         self.scopes.pop()
+        self.slots.pop()
+
+    def add_slot(self, name: str) -> None:
+        slots = self.slots[-1]
+        if name not in slots:
+            slots[name] = len(slots)
 
     def declare(self, name: Token) -> None:
         if not len(self.scopes):
@@ -226,6 +234,7 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
             main_scanner.error(name, "Already a variable with this name in the scope")
 
         curr_scope[name.lexeme] = False
+        self.add_slot(name.lexeme)
 
     def define(self, name: Token) -> None:
         if not len(self.scopes):
@@ -235,5 +244,6 @@ class Resolver(expr.Visitor, stmt.StmtVisitor):
     def resolve_local(self, expr: expr.Expr, name: Token) -> None:
         for i in reversed(range(len(self.scopes))):
             if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
+                expr.depth = len(self.scopes) - 1 - i
+                expr.slot = self.slots[i][name.lexeme]
                 return None
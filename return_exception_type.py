@@ -1,6 +1,28 @@
-from typing import Any
+from typing import Any, List
 
 
-class Return(RuntimeError):
+class Return:
+    """Completion of a statement that executed a "return".
+
+    Statements evaluate to None when control falls through to the next one.
+    A return statement evaluates to a Return instead, and blocks, loops and
+    ifs hand it straight back up to LoxFunction.call, so returning costs no
+    exception.
+    """
+
+    __slots__ = ("value",)
+
     def __init__(self, value: Any):
         self.value = value
+
+
+class TailCall:
+    """Completion of a "return f(...)" whose call has been evaluated up to
+    the point of invoking f. LoxFunction.call makes the call itself, so a
+    chain of tail calls runs in one Python frame instead of nesting."""
+
+    __slots__ = ("callee", "arguments")
+
+    def __init__(self, callee: Any, arguments: List[Any]):
+        self.callee = callee
+        self.arguments = arguments
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import contextlib
+import json
+import time
+import tracemalloc
+from typing import Any, ContextManager, Dict, Iterable, Optional, TextIO
+import expr
+import stmt
+from natives import Counters
+
+PHASES = ("cache", "scan", "parse", "resolve", "execute")
+
+
+class PhaseStats:
+    __slots__ = ("seconds", "peak_memory", "counts")
+
+    def __init__(self):
+        self.seconds = 0.0
+        # The most bytes allocated by the phase and still live at one time,
+        # or None when memory was not traced.
+        self.peak_memory = None
+        self.counts: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seconds": self.seconds,
+            "peak_memory": self.peak_memory,
+            **self.counts,
+        }
+
+
+class RunStats:
+    """Time, peak memory and work counts for each phase of running a
+    program, filled in by main_scanner when passed in RunOptions.stats.
+
+    A phase entered more than once, as every phase is when a script is
+    streamed one statement at a time, adds up its time and counts and keeps
+    its highest peak. Tracing memory slows down allocation-heavy phases, so
+    pass trace_memory=False when only the times matter.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases: Dict[str, PhaseStats] = {}
+
+    def get_phase(self, name: str) -> PhaseStats:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = PhaseStats()
+        return phase
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        phase = self.get_phase(name)
+        tracing = self.trace_memory
+        started_tracing = tracing and not tracemalloc.is_tracing()
+        baseline = 0
+        if started_tracing:
+            tracemalloc.start()
+        elif tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds += time.perf_counter() - started
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                phase.peak_memory = max(phase.peak_memory or 0, peak)
+            if started_tracing:
+                tracemalloc.stop()
+
+    def count(self, phase: str, name: str, value: int) -> None:
+        counts = self.get_phase(phase).counts
+        counts[name] = counts.get(name, 0) + value
+
+    def count_execution(self, counters: Counters) -> None:
+        self.count("execute", "calls", counters.calls)
+        self.count("execute", "environments", counters.environments)
+        self.count("execute", "instances", counters.instances)
+
+    def total_seconds(self) -> float:
+        return sum(phase.seconds for phase in self.phases.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": self.total_seconds(),
+            "phases": {
+                name: self.phases[name].to_dict()
+                for name in PHASES
+                if name in self.phases
+            },
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self, stream: TextIO) -> None:
+        total = self.total_seconds()
+        stream.write(
+            f"{'phase':<10}{'seconds':>10}{'share':>8}{'peak KiB':>10}  counts\n"
+        )
+        for name in PHASES:
+            phase = self.phases.get(name)
+            if phase is None:
+                continue
+            share = phase.seconds / total if total else 0.0
+            peak = "-"
+            if phase.peak_memory is not None:
+                peak = f"{phase.peak_memory / 1024:.0f}"
+            counts = ", ".join(f"{n} {v}" for n, v in phase.counts.items())
+            stream.write(
+                f"{name:<10}{phase.seconds:>10.4f}{share:>8.1%}{peak:>10}  {counts}\n"
+            )
+        stream.write(f"{'total':<10}{total:>10.4f}\n")
+
+
+def phase(stats: Optional[RunStats], name: str) -> ContextManager:
+    """RunStats.phase, or a context that records nothing without stats."""
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
+
+
+def count_nodes(nodes: Iterable[Any]) -> int:
+    """Counts the expression and statement nodes in a syntax tree."""
+    count = 0
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (expr.Expr, stmt.Stmt)):
+            count += 1
+            pending.extend(vars(node).values())
+        elif isinstance(node, list):
+            pending.extend(node)
+    return count
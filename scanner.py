@@ -1,5 +1,5 @@
 from cmath import exp
-from tokens import Token, TokenType
+from tokens import KEYWORDS, Token, TokenType
 from typing import List
 import main_scanner
 
@@ -12,24 +12,7 @@ class Scanner:
         self.current = 0
         self.line = 1
 
-    keywords = {
-        "and": TokenType.AND,
-        "class": TokenType.CLASS,
-        "else": TokenType.ELSE,
-        "false": TokenType.FALSE,
-        "for": TokenType.FOR,
-        "fun": TokenType.FUN,
-        "if": TokenType.IF,
-        "nil": TokenType.NIL,
-        "or": TokenType.OR,
-        "print": TokenType.PRINT,
-        "return": TokenType.RETURN,
-        "super": TokenType.SUPER,
-        "this": TokenType.THIS,
-        "true": TokenType.TRUE,
-        "var": TokenType.VAR,
-        "while": TokenType.WHILE,
-    }
+    keywords = KEYWORDS
 
     def scanTokens(self) -> List[Token]:
         while not self.is_at_end():
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+CACHE_DIRECTORY = "__loxcache__"
+CACHE_SUFFIX = ".loxc"
+
+# Modules whose code determines what a cached tree looks like. Their source
+# is folded into the interpreter version, so editing any of them invalidates
+# every cache entry, much like the magic number in a .pyc header.
+COMPILER_MODULES = (
+    "tokens",
+    "scanner",
+    "regex_scanner",
+    "token_buffer",
+    "expr",
+    "stmt",
+    "parser",
+    "resolver",
+)
+
+_interpreter_version = None
+
+
+def interpreter_version() -> str:
+    global _interpreter_version
+    if _interpreter_version is None:
+        digest = hashlib.sha256(sys.version.encode())
+        for name in COMPILER_MODULES:
+            module = sys.modules.get(name)
+            if module is None or getattr(module, "__file__", None) is None:
+                continue
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        _interpreter_version = digest.hexdigest()
+    return _interpreter_version
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def cache_path(script_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(script_path))
+    return os.path.join(directory, CACHE_DIRECTORY, name + CACHE_SUFFIX)
+
+
+def load(script_path: str, source: str, scanner: str = "regex") -> Optional[List]:
+    try:
+        with open(cache_path(script_path), "rb") as f:
+            header = pickle.load(f)
+            if header != make_header(source, scanner):
+                return None
+            return pickle.load(f)
+    except Exception:
+        # A truncated, corrupt or foreign file can fail to unpickle in many
+        # ways; any of them just means there is no usable entry.
+        return None
+
+
+def store(
+    script_path: str, source: str, statements: List, scanner: str = "regex"
+) -> None:
+    path = cache_path(script_path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=".", suffix=".tmp"
+        )
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(make_header(source, scanner), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(statements, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except (OSError, RecursionError, pickle.PicklingError):
+        # Very deep trees can exceed the pickler's recursion limit; running
+        # without a cache entry is always correct, so just give up.
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def make_header(source: str, scanner: str) -> Dict[str, Any]:
+    # A tree is only reused with the scanner that built it.
+    return {
+        "interpreter": interpreter_version(),
+        "scanner": scanner,
+        "source": source_hash(source),
+    }
@@ -6,6 +6,9 @@ from typing import List
 
 
 class Stmt(ABC):
+    # Line of the statement's first token, set by the parser.
+    line = 0
+
     @abstractmethod
     def accept(self, visitor: StmtVisitor):
         ...
@@ -107,6 +110,8 @@ class Return(Stmt):
     def __init__(self, keyword: Token, value: Expr):
         self.keyword = keyword
         self.value = value
+        # Set by the resolver when the value is a call in tail position.
+        self.tail_call = False
 
     def accept(self, visitor: StmtVisitor):
         return visitor.visit_return_stmt(self)
@@ -0,0 +1,75 @@
+import codecs
+import itertools
+from tokens import Token, TokenType
+from typing import IO, Iterator, Tuple, Union
+import mmap
+from regex_scanner import RegexScanner, TOKEN_PATTERN
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class StreamScanner(RegexScanner):
+    """Scans a text file, binary file or mmap chunk by chunk.
+
+    Tokens are yielded lazily by iter_tokens, so only the current chunk and
+    the lexeme straddling its end are ever held in memory.
+    """
+
+    def __init__(
+        self,
+        stream: Union[IO, mmap.mmap],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        super().__init__("")
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = None
+
+    def read_chunk(self, size: int) -> Tuple[str, bool]:
+        data = self.stream.read(size)
+        if isinstance(data, str):
+            return data, not data
+
+        if self.decoder is None:
+            self.decoder = codecs.getincrementaldecoder("utf-8")()
+        return self.decoder.decode(data, final=not data), not data
+
+    def iter_tokens(self) -> Iterator[Token]:
+        buffer = ""
+        read_size = self.chunk_size
+        at_end = False
+
+        while not at_end:
+            text, at_end = self.read_chunk(read_size)
+            buffer += text
+            pending = []
+
+            if at_end:
+                self.scan_matches(TOKEN_PATTERN.finditer(buffer), pending.append)
+                buffer = ""
+            else:
+                # A lexeme ending on (or one character before) the end of the
+                # buffer might continue in the next chunk: "foo" may become
+                # "foobar", "!" may become "!=" and "1" followed by "." may
+                # become "1.5". Those are rescanned once more input arrives.
+                safe_end = len(buffer) - 1
+                matches = list(
+                    itertools.takewhile(
+                        lambda match: match.end() < safe_end,
+                        TOKEN_PATTERN.finditer(buffer),
+                    )
+                )
+                if matches:
+                    self.scan_matches(matches, pending.append)
+                    buffer = buffer[matches[-1].end() :]
+                    read_size = self.chunk_size
+                else:
+                    read_size *= 2
+
+            yield from pending
+
+        yield Token(TokenType.EOF, "", None, self.line)
+
+    def scanTokens(self):
+        self.tokens = list(self.iter_tokens())
+        return self.tokens
@@ -0,0 +1,163 @@
+from __future__ import annotations
+from array import array
+from collections.abc import Sequence
+import sys
+from typing import Iterator
+from tokens import KEYWORDS, Token, TokenType
+import main_scanner
+from regex_scanner import OPERATORS, TOKEN_PATTERN
+
+TOKEN_TYPES = (None,) + tuple(TokenType)
+
+IDENTIFIER_CODE = TokenType.IDENTIFIER.value
+NUMBER_CODE = TokenType.NUMBER.value
+STRING_CODE = TokenType.STRING.value
+EOF_CODE = TokenType.EOF.value
+
+KEYWORD_CODES = {keyword: token_type.value for keyword, token_type in KEYWORDS.items()}
+OPERATOR_CODES = {text: token_type.value for text, token_type in OPERATORS.items()}
+
+
+class TokenBuffer(Sequence):
+    """Token stream stored as parallel arrays instead of Token objects.
+
+    Each token costs one entry in the type, start, length and line columns.
+    Lexemes are sliced out of the source (and identifiers interned) only
+    when a TokenView asks for them, and literals are derived from the lexeme.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("L")
+        self.lengths = array("L")
+        self.lines = array("L")
+        # The parser keeps re-reading its current and previous token, so the
+        # last view handed out for an even and an odd index is reused.
+        self.recent_views = [None, None]
+
+    def append(self, type_code: int, start: int, length: int, line: int) -> None:
+        self.types.append(type_code)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> TokenView:
+        if index < 0:
+            index += len(self.types)
+        if not 0 <= index < len(self.types):
+            raise IndexError("token index out of range")
+
+        view = self.recent_views[index & 1]
+        if view is None or view.index != index:
+            view = TokenView(self, index)
+            self.recent_views[index & 1] = view
+        return view
+
+    def __iter__(self) -> Iterator[TokenView]:
+        for index in range(len(self.types)):
+            yield TokenView(self, index)
+
+    def lexeme(self, index: int) -> str:
+        start = self.starts[index]
+        text = self.source[start : start + self.lengths[index]]
+        if self.types[index] == IDENTIFIER_CODE:
+            return sys.intern(text)
+        return text
+
+    def token(self, index: int) -> Token:
+        """A standalone Token for a row, for keeping past parsing without
+        holding on to the buffer."""
+        return Token(
+            TOKEN_TYPES[self.types[index]],
+            self.lexeme(index),
+            self.literal(index),
+            self.lines[index],
+        )
+
+    def literal(self, index: int):
+        type_code = self.types[index]
+        if type_code == NUMBER_CODE:
+            return float(self.lexeme(index))
+        if type_code == STRING_CODE:
+            return self.lexeme(index)[1:-1]
+        return None
+
+    def nbytes(self) -> int:
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.types, self.starts, self.lengths, self.lines)
+        )
+
+
+class TokenView:
+    """Read-only stand-in for tokens.Token backed by a TokenBuffer row."""
+
+    __slots__ = ("buffer", "index")
+
+    def __init__(self, buffer: TokenBuffer, index: int):
+        self.buffer = buffer
+        self.index = index
+
+    @property
+    def type(self) -> TokenType:
+        return TOKEN_TYPES[self.buffer.types[self.index]]
+
+    @property
+    def lexeme(self) -> str:
+        return self.buffer.lexeme(self.index)
+
+    @property
+    def literal(self):
+        return self.buffer.literal(self.index)
+
+    @property
+    def line(self) -> int:
+        return self.buffer.lines[self.index]
+
+    def __repr__(self) -> str:
+        return f"{self.type} {self.lexeme} {self.literal}"
+
+
+class CompactScanner:
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = TokenBuffer(source)
+        self.line = 1
+
+    def scanTokens(self) -> TokenBuffer:
+        append = self.tokens.append
+        keyword_codes = KEYWORD_CODES
+        operator_codes = OPERATOR_CODES
+        line = self.line
+
+        for match in TOKEN_PATTERN.finditer(self.source):
+            kind = match.lastgroup
+            start, end = match.span(kind)
+            if kind == "identifier":
+                text = self.source[start:end]
+                code = keyword_codes.get(text, IDENTIFIER_CODE)
+                append(code, start, end - start, line)
+            elif kind == "operator":
+                append(operator_codes[self.source[start:end]], start, end - start, line)
+            elif kind == "newline":
+                line += end - start
+            elif kind == "number":
+                append(NUMBER_CODE, start, end - start, line)
+            elif kind == "string":
+                line += self.source.count("\n", start, end)
+                append(STRING_CODE, start, end - start, line)
+            elif kind == "space" or kind == "comment":
+                continue
+            elif kind == "unterminated":
+                line += self.source.count("\n", start, end)
+                main_scanner.error_with_line(line, "Unterminated string.")
+            else:
+                main_scanner.error_with_line(line, "Unexpected character.")
+
+        self.line = line
+        append(EOF_CODE, len(self.source), 0, line)
+        return self.tokens
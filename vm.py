@@ -0,0 +1,631 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from bytecode import FunctionProto, OpCode
+from bytecode_compiler import BytecodeCompiler
+from lox_callable import LoxCallable
+from lox_class import LoxClass
+from lox_instance import LoxInstance
+from lox_string import STRING_TYPES, concat
+import main_scanner
+import runtime_error
+import stmt
+import tokens as ts
+
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+TRUE = OpCode.TRUE.value
+FALSE = OpCode.FALSE.value
+POP = OpCode.POP.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+GET_UPVALUE = OpCode.GET_UPVALUE.value
+SET_UPVALUE = OpCode.SET_UPVALUE.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+GET_SUPER = OpCode.GET_SUPER.value
+EQUAL = OpCode.EQUAL.value
+NOT_EQUAL = OpCode.NOT_EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+NOT = OpCode.NOT.value
+NEGATE = OpCode.NEGATE.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+LOOP = OpCode.LOOP.value
+CALL = OpCode.CALL.value
+INVOKE = OpCode.INVOKE.value
+SUPER_INVOKE = OpCode.SUPER_INVOKE.value
+CLOSURE = OpCode.CLOSURE.value
+CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+RETURN = OpCode.RETURN.value
+CLASS = OpCode.CLASS.value
+TAIL_CALL = OpCode.TAIL_CALL.value
+TAIL_INVOKE = OpCode.TAIL_INVOKE.value
+
+# Call frames live on the heap, so Lox recursion depth is bounded by memory
+# rather than by Python's recursion limit. A frame plus its stack slots
+# costs on the order of 100 bytes, so the default caps the call stack at
+# roughly 100 MB.
+DEFAULT_MAX_FRAMES = 1_000_000
+
+# Token types handed to Interpreter.binary_operation when the operands miss
+# the float fast path, so coercions and error messages match the tree-walker.
+BINARY_TOKENS = {
+    EQUAL: (ts.TokenType.EQUAL_EQUAL, "=="),
+    NOT_EQUAL: (ts.TokenType.BANG_EQUAL, "!="),
+    GREATER: (ts.TokenType.GREATER, ">"),
+    GREATER_EQUAL: (ts.TokenType.GREATER_EQUAL, ">="),
+    LESS: (ts.TokenType.LESS, "<"),
+    LESS_EQUAL: (ts.TokenType.LESS_EQUAL, "<="),
+    ADD: (ts.TokenType.PLUS, "+"),
+    SUBTRACT: (ts.TokenType.MINUS, "-"),
+    MULTIPLY: (ts.TokenType.STAR, "*"),
+    DIVIDE: (ts.TokenType.SLASH, "/"),
+}
+
+
+class Upvalue:
+    """A captured variable: it points at a stack slot while the variable is
+    in scope and holds the value itself once the slot is popped."""
+
+    __slots__ = ("index", "value")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.value = None
+
+
+class VMClosure(LoxCallable):
+    __slots__ = ("function", "upvalues", "vm")
+
+    def __init__(self, function: FunctionProto, upvalues: List[Upvalue], vm: VM):
+        self.function = function
+        self.upvalues = upvalues
+        self.vm = vm
+
+    def bind(self, instance: LoxInstance) -> VMBoundMethod:
+        return VMBoundMethod(instance, self)
+
+    def call(self, interpreter, arguments: List[Any]) -> Any:
+        return self.vm.call_closure(self, self, arguments)
+
+    def arity(self) -> int:
+        return self.function.arity
+
+    def __repr__(self) -> str:
+        return self.to_string()
+
+    def to_string(self) -> str:
+        return f"<fn {self.function.name}>"
+
+
+class VMBoundMethod(LoxCallable):
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: Any, method: VMClosure):
+        self.receiver = receiver
+        self.method = method
+
+    def call(self, interpreter, arguments: List[Any]) -> Any:
+        return self.method.vm.call_closure(self.method, self.receiver, arguments)
+
+    def arity(self) -> int:
+        return self.method.function.arity
+
+    def __repr__(self) -> str:
+        return self.method.to_string()
+
+    def to_string(self) -> str:
+        return self.method.to_string()
+
+
+class CallFrame:
+    __slots__ = ("closure", "ip", "base")
+
+    def __init__(self, closure: VMClosure, ip: int, base: int):
+        self.closure = closure
+        self.ip = ip
+        self.base = base
+
+
+class VM:
+    """Runs FunctionProto bytecode on a single value stack.
+
+    Lox calls push a CallFrame instead of recursing in Python, so the only
+    Python-level re-entry is when a native or LoxClass.call invokes a
+    closure. Builtins (natives, LoxClass, LoxInstance) are shared with the
+    tree-walking interpreter, whose globals and helpers are reused as-is.
+    """
+
+    def __init__(
+        self,
+        interpreter,
+        max_frames: Optional[int] = None,
+        code_cache: Optional[Dict[Any, Any]] = None,
+    ):
+        self.interpreter = interpreter
+        self.code_cache = code_cache
+        self.max_frames = DEFAULT_MAX_FRAMES if max_frames is None else max_frames
+        self.globals = interpreter.globals.values
+        self.counters = interpreter.counters
+        self.budget = interpreter.budget
+        self.stack = []
+        self.frames = []
+        self.open_upvalues = {}
+
+    def interpret(self, statements: List[stmt.Stmt]) -> None:
+        function = self.compile(statements)
+        try:
+            # The script's frame is pushed directly: it is not a Lox call.
+            closure = VMClosure(function, [], self)
+            self.stack.append(closure)
+            self.frames.append(CallFrame(closure, 0, 0))
+            self.run(0)
+        except runtime_error.RuntimeError as e:
+            self.stack.clear()
+            self.frames.clear()
+            self.open_upvalues.clear()
+            main_scanner.lox_runtime_error(e)
+
+    def compile(self, statements: List[stmt.Stmt]) -> FunctionProto:
+        tail_calls = self.interpreter.tail_calls
+        key = ("vm", tail_calls)
+        cache = self.code_cache
+        if cache is not None and key in cache:
+            return cache[key]
+        function = BytecodeCompiler(tail_calls=tail_calls).compile(statements)
+        if cache is not None:
+            cache[key] = function
+        return function
+
+    def call_closure(
+        self, closure: VMClosure, receiver: Any, arguments: List[Any]
+    ) -> Any:
+        stack = self.stack
+        base = len(stack)
+        stack.append(receiver)
+        stack.extend(arguments)
+        self.push_frame(closure, len(arguments), base, closure.function.chunk.lines[0])
+        return self.run(len(self.frames) - 1)
+
+    def push_frame(self, closure: VMClosure, argc: int, base: int, line: int) -> None:
+        if argc != closure.function.arity:
+            self.error(
+                line, f"Expected {closure.function.arity} arguments but got {argc}."
+            )
+        if len(self.frames) >= self.max_frames:
+            self.error(line, "Stack overflow.")
+        if self.budget is not None:
+            self.budget.tick(line)
+        self.counters.calls += 1
+        self.frames.append(CallFrame(closure, 0, base))
+
+    def reuse_frame(
+        self, frame: CallFrame, closure: VMClosure, argc: int, line: int
+    ) -> None:
+        """Makes a tail call by replacing the current frame's closure, locals
+        and arguments in place instead of pushing a new frame."""
+        if argc != closure.function.arity:
+            self.error(
+                line, f"Expected {closure.function.arity} arguments but got {argc}."
+            )
+        if self.open_upvalues:
+            self.close_upvalues(frame.base)
+        if self.budget is not None:
+            self.budget.tick(line)
+        self.counters.calls += 1
+        stack = self.stack
+        stack[frame.base :] = stack[len(stack) - argc - 1 :]
+        frame.closure = closure
+
+    def call_value(self, callee: Any, argc: int, line: int) -> bool:
+        """Calls the value sitting below argc arguments on the stack. Returns
+        True if a new frame was pushed, otherwise the result has already
+        replaced the callee and its arguments."""
+        stack = self.stack
+        base = len(stack) - argc - 1
+        callee_type = type(callee)
+        if callee_type is VMClosure:
+            self.push_frame(callee, argc, base, line)
+            return True
+        if callee_type is VMBoundMethod:
+            stack[base] = callee.receiver
+            self.push_frame(callee.method, argc, base, line)
+            return True
+        if isinstance(callee, LoxClass):
+            instance = LoxInstance(callee)
+            self.counters.instances += 1
+            stack[base] = instance
+            initializer = callee.initializer
+            if initializer is not None:
+                self.push_frame(initializer, argc, base, line)
+                return True
+            if argc != 0:
+                self.error(line, f"Expected 0 arguments but got {argc}.")
+            return False
+        if isinstance(callee, LoxCallable):
+            if argc != callee.arity():
+                self.error(
+                    line, f"Expected {callee.arity()} arguments but got {argc}."
+                )
+            arguments = stack[base + 1 :]
+            del stack[base:]
+            stack.append(callee.call(self.interpreter, arguments))
+            return False
+        self.error(line, "can only call functions and classes.")
+
+    def capture_upvalue(self, index: int) -> Upvalue:
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = Upvalue(index)
+            self.open_upvalues[index] = upvalue
+        return upvalue
+
+    def close_upvalues(self, last: int) -> None:
+        stack = self.stack
+        open_upvalues = self.open_upvalues
+        for index in [i for i in open_upvalues if i >= last]:
+            upvalue = open_upvalues.pop(index)
+            upvalue.value = stack[index]
+            upvalue.index = -1
+
+    def error(self, line: int, message: str):
+        raise runtime_error.RuntimeError(ts.Token(None, "", None, line), message)
+
+    def run(self, exit_depth: int) -> Any:
+        """Executes until the frame at exit_depth returns, and returns its
+        result."""
+        stack = self.stack
+        frames = self.frames
+        globals = self.globals
+        interpreter = self.interpreter
+        stringify = interpreter.stringify
+        write_line = interpreter.output.write_line
+        budget = self.budget
+
+        frame = frames[-1]
+        closure = frame.closure
+        code = closure.function.chunk.code
+        constants = closure.function.chunk.constants
+        ip = frame.ip
+        base = frame.base
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                stack.append(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                stack.append(constants[code[ip]])
+                ip += 1
+            elif op == GET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name not in globals:
+                    self.error(
+                        closure.function.chunk.lines[ip - 1],
+                        "Undefined variable '" + name + "'.",
+                    )
+                stack.append(globals[name])
+            elif op == POP:
+                stack.pop()
+            elif op == JUMP_IF_FALSE:
+                if stack[-1]:
+                    ip += 1
+                else:
+                    ip += code[ip] + 1
+            elif op == ADD:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a + b
+                elif type(a) in STRING_TYPES and type(b) in STRING_TYPES:
+                    stack[-1] = concat(a, b)
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == SUBTRACT:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a - b
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == LESS:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a < b
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == CALL:
+                argc = code[ip]
+                ip += 1
+                frame.ip = ip
+                callee = stack[-1 - argc]
+                if self.call_value(callee, argc, closure.function.chunk.lines[ip - 1]):
+                    frame = frames[-1]
+                    closure = frame.closure
+                    code = closure.function.chunk.code
+                    constants = closure.function.chunk.constants
+                    ip = 0
+                    base = frame.base
+            elif op == RETURN:
+                result = stack.pop()
+                if self.open_upvalues:
+                    self.close_upvalues(base)
+                del stack[base:]
+                frames.pop()
+                if len(frames) == exit_depth:
+                    return result
+                stack.append(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                ip = frame.ip
+                base = frame.base
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == LOOP:
+                if budget is not None:
+                    budget.tick(closure.function.chunk.lines[ip])
+                ip -= code[ip] - 1
+            elif op == JUMP:
+                ip += code[ip] + 1
+            elif op == GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.index >= 0:
+                    stack.append(stack[upvalue.index])
+                else:
+                    stack.append(upvalue.value)
+            elif op == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.index >= 0:
+                    stack[upvalue.index] = stack[-1]
+                else:
+                    upvalue.value = stack[-1]
+            elif op == GREATER:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a > b
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == GREATER_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a >= b
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == LESS_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a <= b
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == MULTIPLY:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a * b
+                else:
+                    stack[-1] = self.binary(op, a, b, closure, ip)
+            elif op == DIVIDE or op == EQUAL or op == NOT_EQUAL:
+                b = stack.pop()
+                stack[-1] = self.binary(op, stack[-1], b, closure, ip)
+            elif op == INVOKE:
+                name = constants[code[ip]]
+                argc = code[ip + 1]
+                ip += 2
+                frame.ip = ip
+                line = closure.function.chunk.lines[ip - 1]
+                receiver = stack[-1 - argc]
+                if not isinstance(receiver, LoxInstance):
+                    self.error(line, "Only instances have properties.")
+                field = receiver.get_field(name)
+                if field is not None:
+                    stack[-1 - argc] = field
+                    pushed = self.call_value(field, argc, line)
+                else:
+                    method = receiver.klass.find_method(name)
+                    if method is None:
+                        self.error(line, "Undefined property '" + name + "'.")
+                    self.push_frame(method, argc, len(stack) - argc - 1, line)
+                    pushed = True
+                if pushed:
+                    frame = frames[-1]
+                    closure = frame.closure
+                    code = closure.function.chunk.code
+                    constants = closure.function.chunk.constants
+                    ip = 0
+                    base = frame.base
+            elif op == GET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    self.error(
+                        closure.function.chunk.lines[ip - 1],
+                        "Only instances have properties.",
+                    )
+                value = instance.get_field(name)
+                if value is None:
+                    method = instance.klass.find_method(name)
+                    if method is None:
+                        self.error(
+                            closure.function.chunk.lines[ip - 1],
+                            "Undefined property '" + name + "'.",
+                        )
+                    value = method.bind(instance)
+                stack[-1] = value
+            elif op == SET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                value = stack.pop()
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    self.error(
+                        closure.function.chunk.lines[ip - 1],
+                        "Only instances have fields.",
+                    )
+                instance.set_field(name, value)
+                stack[-1] = value
+            elif op == NIL:
+                stack.append(None)
+            elif op == TRUE:
+                stack.append(True)
+            elif op == FALSE:
+                stack.append(False)
+            elif op == NOT:
+                stack[-1] = stringify(not stack[-1])
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is float:
+                    stack[-1] = -value
+                else:
+                    stack[-1] = self.negate(value, closure, ip)
+            elif op == PRINT:
+                write_line(stringify(stack.pop()))
+            elif op == DEFINE_GLOBAL:
+                globals[constants[code[ip]]] = stack.pop()
+                ip += 1
+            elif op == SET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name not in globals:
+                    self.error(
+                        closure.function.chunk.lines[ip - 1],
+                        "Undefined variable '" + name + "'.",
+                    )
+                globals[name] = stack[-1]
+            elif op == CLOSURE:
+                function = constants[code[ip]]
+                ip += 1
+                upvalues = []
+                for i in range(function.upvalue_count):
+                    if code[ip]:
+                        upvalues.append(self.capture_upvalue(base + code[ip + 1]))
+                    else:
+                        upvalues.append(closure.upvalues[code[ip + 1]])
+                    ip += 2
+                stack.append(VMClosure(function, upvalues, self))
+            elif op == CLOSE_UPVALUE:
+                self.close_upvalues(len(stack) - 1)
+                stack.pop()
+            elif op == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                superclass = stack.pop()
+                method = superclass.find_method(name)
+                if method is None:
+                    self.error(
+                        closure.function.chunk.lines[ip - 1],
+                        "Undefined property '" + name + "'.",
+                    )
+                stack[-1] = method.bind(stack[-1])
+            elif op == SUPER_INVOKE:
+                name = constants[code[ip]]
+                argc = code[ip + 1]
+                ip += 2
+                frame.ip = ip
+                line = closure.function.chunk.lines[ip - 1]
+                superclass = stack.pop()
+                method = superclass.find_method(name)
+                if method is None:
+                    self.error(line, "Undefined property '" + name + "'.")
+                self.push_frame(method, argc, len(stack) - argc - 1, line)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                ip = 0
+                base = frame.base
+            elif op == TAIL_CALL or op == TAIL_INVOKE:
+                if op == TAIL_CALL:
+                    argc = code[ip]
+                    ip += 1
+                    line = closure.function.chunk.lines[ip - 1]
+                    callee = stack[-1 - argc]
+                else:
+                    name = constants[code[ip]]
+                    argc = code[ip + 1]
+                    ip += 2
+                    line = closure.function.chunk.lines[ip - 1]
+                    receiver = stack[-1 - argc]
+                    if not isinstance(receiver, LoxInstance):
+                        self.error(line, "Only instances have properties.")
+                    callee = receiver.get_field(name)
+                    if callee is not None:
+                        stack[-1 - argc] = callee
+                    else:
+                        # The receiver stays in slot 0 for the method.
+                        callee = receiver.klass.find_method(name)
+                        if callee is None:
+                            self.error(line, "Undefined property '" + name + "'.")
+                frame.ip = ip
+
+                if type(callee) is VMBoundMethod:
+                    stack[-1 - argc] = callee.receiver
+                    callee = callee.method
+                if type(callee) is VMClosure:
+                    self.reuse_frame(frame, callee, argc, line)
+                    pushed = True
+                else:
+                    pushed = self.call_value(callee, argc, line)
+                if pushed:
+                    frame = frames[-1]
+                    closure = frame.closure
+                    code = closure.function.chunk.code
+                    constants = closure.function.chunk.constants
+                    ip = 0
+                    base = frame.base
+            elif op == CLASS:
+                name = constants[code[ip]]
+                method_count = code[ip + 1]
+                has_superclass = code[ip + 2]
+                ip += 3
+                methods = {}
+                if method_count:
+                    for method in stack[-method_count:]:
+                        methods[method.function.name] = method
+                    del stack[-method_count:]
+                superclass = None
+                if has_superclass:
+                    superclass = stack[-1]
+                    if not isinstance(superclass, LoxClass):
+                        self.error(
+                            closure.function.chunk.lines[ip - 1],
+                            "Superclass must be a class.",
+                        )
+                stack.append(LoxClass(name, superclass, methods))
+            else:
+                raise ValueError(f"Unknown opcode {op}.")
+
+    def negate(self, value: Any, closure: VMClosure, ip: int) -> Any:
+        line = closure.function.chunk.lines[ip - 1]
+        operator = ts.Token(ts.TokenType.MINUS, "-", None, line)
+        return self.interpreter.negate(operator, value)
+
+    def binary(self, op: int, a: Any, b: Any, closure: VMClosure, ip: int) -> Any:
+        token_type, lexeme = BINARY_TOKENS[op]
+        line = closure.function.chunk.lines[ip - 1]
+        operator = ts.Token(token_type, lexeme, None, line)
+        return self.interpreter.binary_operation(operator, a, b)
+